@@ -0,0 +1,208 @@
+import sys
+import asyncio
+import argparse
+from typing import Any, Dict, List
+import pandas as pd
+from application_logging.logger import logger
+from utils.helpers import read_params
+from utils.http_cache import get_cache
+from utils.pools import get_pools
+from utils.blocks import block_before
+from utils.call_cache import CallCache, epoch_closed
+from utils.epochs import current_epoch, epoch_start
+from utils.multicall import Call, Multicall, abi_contract, is_live, read_rewards
+from utils.rpc import AsyncRPCClient
+from utils.publisher import get_publisher
+from utils.rewards import emissions_frame, reward_amounts, reward_rows
+from utils.store import Store
+from utils.tokens import TokenRegistry, get_tokens
+
+# Recomputes bribe, fee and emissions data for a range of past epochs in one run. Every epoch is read
+# concurrently with eth_calls pinned to the block at its boundary (params.yaml backfill:), the store is
+# updated once per dataset and each dataset is published once.
+#   python backfill.py --from-epoch 10 --to-epoch 120
+#   python backfill.py --from-epoch 150 --datasets fee_data --no-publish
+# Pinned reads need archive RPC endpoints (backfill.provider_urls). Token prices (and the THE price of
+# emissions) are the current ones from the price API and names come from the current ID table, so by default
+# only epochs missing from the store are filled. --reprice recomputes and overwrites stored epochs as well:
+# bribes and fees at current prices, while emissions keep the THE price stored for the epoch.
+# Epochs without any rows are logged and left out.
+
+DATASETS = ["bribe_data", "fee_data", "emissions_data"]
+
+
+class Backfill:
+    def __init__(self, config: Dict[str, Any], client: AsyncRPCClient, call_cache: CallCache):
+        web3_config = config["web3"]
+        self.client = client
+        self.call_cache = call_cache
+        self.emissions_block_offset = config["backfill"]["emissions_block_offset"]
+        self.multicall = Multicall(client, web3_config["multicall_contract"], web3_config["multicall_abi"], web3_config["multicall_batch_size"], call_cache)
+        self.bribe_contract = abi_contract(web3_config["bribe_abi"])
+        self.gauge_contract = abi_contract(web3_config["gauge_abi"])
+        self.blocks: Dict[int, asyncio.Future] = {}
+
+    async def find_block(self, timestamp: int) -> Any:
+        try:
+            return await block_before(self.client, timestamp, self.call_cache)
+        except ValueError:
+            # The boundary is still ahead (current epoch), read the latest state like the scheduled scripts
+            return "latest"
+
+    def block(self, timestamp: int) -> asyncio.Future:
+        # One search per boundary however many datasets read at it
+        if timestamp not in self.blocks:
+            self.blocks[timestamp] = asyncio.ensure_future(self.find_block(timestamp))
+        return self.blocks[timestamp]
+
+    async def rewards(self, addresses: List[str], epoch: int) -> List[List[Dict[str, Any]]]:
+        # Bribes and fees of an epoch are rewardData keyed by the start of the next one, as in bribe_data.py
+        timestamp = epoch_start(epoch + 1)
+        block = await self.block(timestamp)
+        return await read_rewards(self.multicall, self.bribe_contract, addresses, timestamp, final=epoch_closed(timestamp), block=block)
+
+    async def emissions(self, gauges: List[str], bribes: List[str], epoch: int):
+        timestamp = epoch_start(epoch)
+        block = await self.block(timestamp + self.emissions_block_offset)
+        gauge_calls = [Call(gauge, self.gauge_contract, "rewardForDuration") for gauge in gauges]
+        bribe_calls = [Call(bribe, self.bribe_contract, "_totalSupply", (timestamp,)) for bribe in bribes]
+        gauge_results, bribe_results = await asyncio.gather(
+            self.multicall.aggregate(gauge_calls, block), self.multicall.aggregate(bribe_calls, block, final=epoch_closed(timestamp))
+        )
+        return dict(zip(gauges, gauge_results)), dict(zip(bribes, bribe_results))
+
+
+async def read_epochs(config: Dict[str, Any], plan: Dict[str, List[int]], new_ids_df: pd.DataFrame, ids_df: pd.DataFrame, tokens: TokenRegistry) -> Dict[str, List[Any]]:
+    # plan is dataset -> epochs to read; returns, per dataset, one raw result per planned epoch
+    call_cache = CallCache.from_config(config)
+    provider_urls = config["backfill"]["provider_urls"]
+    if provider_urls:
+        config = {**config, "web3": {**config["web3"], "provider_urls": provider_urls}}
+    async with AsyncRPCClient.from_config(config) as client:
+        backfill = Backfill(config, client, call_cache)
+        gauges = [gauge for gauge in ids_df["gauges"] if is_live(gauge)]
+        bribes = [bribe for bribe in ids_df["bribe_ca"] if is_live(bribe)]
+        reads = {
+            "bribe_data": lambda epoch: backfill.rewards(new_ids_df["bribe_ca"].tolist(), epoch),
+            "fee_data": lambda epoch: backfill.rewards(new_ids_df["fee_ca"].tolist(), epoch),
+            "emissions_data": lambda epoch: backfill.emissions(gauges, bribes, epoch),
+        }
+        results = await asyncio.gather(*(reads[dataset](epoch) for dataset, epochs in plan.items() for epoch in epochs))
+        split = {}
+        for dataset, epochs in plan.items():
+            split[dataset], results = results[:len(epochs)], results[len(epochs):]
+        results = split
+        reward_tokens = [
+            reward["address"]
+            for dataset in ("bribe_data", "fee_data") for rewards in results.get(dataset, [])
+            for contract_rewards in rewards for reward in contract_rewards
+        ]
+        await tokens.resolve(backfill.multicall, reward_tokens)
+        logger.info(f"Backfill read in {backfill.multicall.requests} RPC requests, {backfill.multicall.cached} calls from cache")
+    return results
+
+
+def epochs_to_fill(store: Store, dataset: str, epochs: List[int], reprice: bool = False) -> List[int]:
+    # Epochs of the range that are not in the store yet; all of them with reprice
+    if reprice:
+        return list(epochs)
+    stored = set(store.read(dataset, ["epoch"], start=min(epochs))["epoch"]) if epochs else set()
+    return [epoch for epoch in epochs if epoch not in stored]
+
+
+def reward_frames(names: pd.Series, epochs: List[int], results: List[Any], tokens: TokenRegistry, raw_column: str, amount_column: str) -> Dict[int, pd.DataFrame]:
+    frames = {}
+    for epoch, rewards in zip(epochs, results):
+        rewards_df = reward_rows(names, rewards, raw_column)
+        if not rewards_df.empty:
+            rewards_df = reward_amounts(rewards_df, tokens, raw_column, amount_column)
+            rewards_df["epoch"] = epoch
+        frames[epoch] = rewards_df
+    return frames
+
+
+def filled_frames(dataset: str, frames: Dict[int, pd.DataFrame]) -> Dict[int, pd.DataFrame]:
+    # Drops epochs without rows (an early epoch with no rewards) so they do not abort the rest of the range
+    for epoch in [epoch for epoch, df in frames.items() if df.empty]:
+        logger.error(f"Backfill found no {dataset} rows for epoch {epoch}, skipping it")
+    frames = {epoch: df for epoch, df in frames.items() if not df.empty}
+    if not frames:
+        raise Exception("Dataframe is empty")
+    return frames
+
+
+if __name__ == "__main__":
+    config = read_params("params.yaml")
+
+    parser = argparse.ArgumentParser(description="Recompute bribe, fee and emissions data for past epochs")
+    parser.add_argument("--from-epoch", type=int, required=True, help="first epoch to recompute")
+    parser.add_argument("--to-epoch", type=int, help="last epoch to recompute, inclusive (default: --from-epoch)")
+    parser.add_argument("--datasets", nargs="+", choices=DATASETS, default=DATASETS, help="datasets to recompute (default: all)")
+    parser.add_argument("--reprice", action="store_true", help="also recompute epochs already in the store, overwriting bribes and fees at current prices and names (emissions keep their stored THE price)")
+    parser.add_argument("--no-publish", action="store_true", help="only update the local store")
+    args = parser.parse_args()
+    to_epoch = args.from_epoch if args.to_epoch is None else args.to_epoch
+    if to_epoch < args.from_epoch:
+        parser.error("--to-epoch is before --from-epoch")
+
+    if args.from_epoch < 0 or to_epoch > current_epoch():
+        parser.error(f"epochs must be between 0 and the current epoch {current_epoch()}")
+    epochs = list(range(args.from_epoch, to_epoch + 1))
+
+    store = Store.from_config(config)
+    cache = get_cache(config)
+    tokens = get_tokens(config)
+    failed = []
+
+    logger.info(f"Backfill Started: epochs {args.from_epoch}-{to_epoch}, {', '.join(args.datasets)}")
+    try:
+        plan = {}
+        for dataset in args.datasets:
+            plan[dataset] = epochs_to_fill(store, dataset, epochs, args.reprice)
+            logger.info(f"Backfill {dataset}: {len(plan[dataset])} epochs to compute, {len(epochs) - len(plan[dataset])} already stored")
+        plan = {dataset: dataset_epochs for dataset, dataset_epochs in plan.items() if dataset_epochs}
+        tokens.refresh(cache.get_json(config["api"]["price_api"]))
+        results = asyncio.run(read_epochs(config, plan, get_pools(config, "new_id_data").frame(), get_pools(config, "id_data").frame(), tokens))
+        tokens.save()
+    except Exception as e:
+        logger.error("Error occurred during Backfill reads. Error: %s" % e)
+        sys.exit(1)
+
+    for dataset in plan:
+        try:
+            if dataset == "emissions_data":
+                # Only --reprice plans stored epochs; their THE price is kept, new epochs take the current one
+                stored_prices = {}
+                if args.reprice:
+                    stored = store.read(dataset, ["epoch", "THE_price"], start=args.from_epoch)
+                    stored_prices = stored.drop_duplicates("epoch").set_index("epoch")["THE_price"].to_dict()
+                ids_df = get_pools(config, "id_data").frame()
+                frames = {}
+                for epoch, (gauge_rewards, bribe_supplies) in zip(plan[dataset], results[dataset]):
+                    THE_price = stored_prices.get(epoch, tokens.price_of("THENA"))
+                    frames[epoch] = emissions_frame(ids_df, gauge_rewards, bribe_supplies, THE_price, epoch)
+            else:
+                raw_column, amount_column = ("bribes", "bribe_amount") if dataset == "bribe_data" else ("fees", "fee_amount")
+                frames = reward_frames(get_pools(config, "new_id_data").frame(columns=["name"])["name"], plan[dataset], results[dataset], tokens, raw_column, amount_column)
+            frames = filled_frames(dataset, frames)
+            df = pd.concat(frames.values(), ignore_index=True)
+            store.replace_keys(dataset, df, list(frames))
+            logger.info(f"Backfill wrote {len(df)} {dataset} rows")
+        except Exception as e:
+            failed.append(dataset)
+            logger.error(f"Error occurred during Backfill of {dataset}. Error: {e}")
+
+    if not args.no_publish:
+        publisher = get_publisher()
+        for dataset in plan:
+            if dataset in failed:
+                continue
+            try:
+                changes = publisher.publish(store, dataset, config["gsheets"][f"{dataset}_sheet_key"])
+                logger.error(f"Data successfully synced to Google Sheets: {changes}")
+            except Exception as e:
+                failed.append(dataset)
+                logger.error(f"Error occurred while publishing {dataset}. Error: {e}")
+
+    logger.info(f"Backfill Ended, failed: {failed}")
+    sys.exit(1 if failed else 0)
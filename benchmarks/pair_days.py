@@ -0,0 +1,82 @@
+# Rows/sec of the V1 pair-day enrichment in pair_data.py, per-row lambdas with an epoch_daily.csv merge
+# (previous code) vs utils.transforms.pair_days + pair_fees
+# Run from the repository root: python -m benchmarks.pair_days [rows]
+import sys
+import time
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from utils.epochs import GENESIS as EPOCH_GENESIS
+from utils.transforms import pair_days, pair_fees
+
+COLUMNS = ['id', 'date', 'dailyVolumeToken0', 'dailyVolumeToken1', 'dailyVolumeUSD', 'reserveUSD', '__typename', 'name', 'address', 'type', 'epoch', 'fee %', 'fee']
+
+
+def pair_days_lambda(pairdata_df: pd.DataFrame, ids_df: pd.DataFrame, epoch_data: pd.DataFrame) -> pd.DataFrame:
+    epoch_data = epoch_data.copy()
+    epoch_data["date"] = epoch_data["date"].apply(lambda date: datetime.strptime(date, "%d-%m-%Y").date())
+
+    pairdata_df = pairdata_df.copy()
+    pairdata_df["date"] = pairdata_df["date"].apply(lambda timestamp: datetime.utcfromtimestamp(timestamp).date())
+    pairdata_df = pd.merge(pairdata_df, ids_df[["name", "address", "type"]], how="left", on="name")
+    pairdata_df = pd.merge(pairdata_df, epoch_data[["date", "epoch"]], how="left", on="date")
+
+    pairdata_df["fee %"] = pairdata_df["type"]
+    pairdata_df["fee %"].replace({"vAMM": 0.20, "sAMM": 0.01}, inplace=True)
+
+    pairdata_df["dailyVolumeUSD"] = pd.to_numeric(pairdata_df["dailyVolumeUSD"])
+    pairdata_df["fee"] = (pairdata_df["dailyVolumeUSD"] * pairdata_df["fee %"]) / 100
+    pairdata_df.sort_values("date", ascending=True, inplace=True)
+    pairdata_df["date"] = pairdata_df["date"].apply(lambda date: datetime.strftime(date, "%Y-%m-%d"))
+    return pairdata_df[COLUMNS]
+
+
+def pair_days_vectorized(pairdata_df: pd.DataFrame, ids_df: pd.DataFrame, epoch_data: pd.DataFrame) -> pd.DataFrame:
+    return pair_fees(pair_days(pairdata_df, ids_df, ["name", "address", "type"]))[COLUMNS]
+
+
+def sample(rows: int):
+    # Same shape as the subgraph rows collected by pair_data.py: one row per pair and day, date as a unix timestamp
+    rng = np.random.default_rng(0)
+    pairs = 2000
+    names = [f"{'vAMM' if i % 3 else 'sAMM'}-T{i}/WBNB" for i in range(pairs)]
+    ids_df = pd.DataFrame({
+        "name": names,
+        "address": [f"0x{i:040x}" for i in range(pairs)],
+        "type": [name[:4] for name in names],
+    })
+    days = rng.integers(0, 1200, rows)
+    pairdata_df = pd.DataFrame({
+        "id": [f"0x{i:040x}-{day}" for i, day in enumerate(days)],
+        "date": EPOCH_GENESIS + days * 86400,
+        "dailyVolumeToken0": rng.uniform(0, 1e6, rows).round(6).astype(str),
+        "dailyVolumeToken1": rng.uniform(0, 1e6, rows).round(6).astype(str),
+        "dailyVolumeUSD": rng.uniform(0, 1e6, rows).round(6).astype(str),
+        "reserveUSD": rng.uniform(0, 1e7, rows).round(6).astype(str),
+        "__typename": "PairDayData",
+        "name": rng.choice(names, rows),
+    })
+    day_index = np.arange(1200)
+    epoch_data = pd.DataFrame({
+        "epoch": day_index // 7,
+        "date": pd.to_datetime(EPOCH_GENESIS + day_index * 86400, unit="s").strftime("%d-%m-%Y"),
+        "timestamp": EPOCH_GENESIS + day_index * 86400,
+    })
+    return pairdata_df, ids_df, epoch_data
+
+
+def rows_per_sec(fn, *frames: pd.DataFrame) -> float:
+    start = time.perf_counter()
+    fn(*frames)
+    return len(frames[0]) / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    frames = sample(rows)
+    before = pair_days_lambda(*frames).sort_values("id").astype(str)
+    after = pair_days_vectorized(*frames).sort_values("id").astype(str)
+    assert before.values.tolist() == after.values.tolist()
+    print(f"{rows} rows")
+    print(f"lambda:     {rows_per_sec(pair_days_lambda, *frames):>14,.0f} rows/sec")
+    print(f"vectorized: {rows_per_sec(pair_days_vectorized, *frames):>14,.0f} rows/sec")
@@ -0,0 +1,80 @@
+# Rows/sec of the reward valuation in bribe_data.py/fee_data.py, per-row ljust divisor loop (previous code)
+# vs utils.rewards.reward_amounts on the token registry, and the error of each against exact rational arithmetic
+# Run from the repository root: python -m benchmarks.reward_amounts [rows]
+import os
+import sys
+import time
+import tempfile
+from fractions import Fraction
+import numpy as np
+import pandas as pd
+from utils.helpers import read_params
+from utils.rewards import reward_amounts
+from utils.tokens import TokenRegistry
+
+
+def reward_amounts_loop(rewards_df: pd.DataFrame, price_df: pd.DataFrame, raw_column: str, amount_column: str) -> pd.DataFrame:
+    rewards_df = rewards_df.copy()
+    rewards_df["address"] = rewards_df["address"].apply(str.lower)
+    rewards_df = rewards_df.merge(price_df[["address", "price", "decimals"]], on="address", how="left")
+    rewards_df[amount_column] = rewards_df["price"] * rewards_df[raw_column]
+
+    amount = []
+    for dec, amt in zip(rewards_df["decimals"], rewards_df[amount_column]):
+        decimal = "1"
+        decimal = decimal.ljust(dec + 1, "0")
+        amount.append((amt / int(decimal)))
+
+    rewards_df[amount_column] = amount
+    return rewards_df.groupby(by="name")[amount_column].sum().reset_index()
+
+
+def sample(rows: int):
+    # Reward rows as built from read_rewards: uint256 amounts as Python ints, tokens with 6, 8 and 18 decimals
+    rng = np.random.default_rng(0)
+    tokens = 200
+    decimals = rng.choice([6, 8, 18], tokens)
+    addresses = [f"0x{i:040x}" for i in range(tokens)]
+    price_df = pd.DataFrame({
+        "name": [f"T{i}" for i in range(tokens)],
+        "address": addresses,
+        "price": rng.uniform(0.001, 50000, tokens).round(8),
+        "decimals": decimals,
+    })
+    token = rng.integers(0, tokens, rows)
+    whole = rng.integers(1, 10 ** 7, rows)
+    fraction = rng.integers(0, 2 ** 62, rows)
+    raw = [int(w) * 10 ** int(decimals[t]) + int(f) % 10 ** int(decimals[t]) for w, f, t in zip(whole, fraction, token)]
+    rewards_df = pd.DataFrame({
+        "name": [f"vAMM-P{i % 5000}" for i in range(rows)],
+        "bribes": pd.Series(raw, dtype=object),
+        "address": [addresses[t] for t in token],
+    })
+    return rewards_df, price_df
+
+
+def exact(rewards_df: pd.DataFrame, price_df: pd.DataFrame) -> pd.Series:
+    prices = price_df.set_index("address")
+    totals = {}
+    for name, raw, address in zip(rewards_df["name"], rewards_df["bribes"], rewards_df["address"]):
+        value = Fraction(raw, 10 ** int(prices.at[address, "decimals"])) * Fraction(prices.at[address, "price"])
+        totals[name] = totals.get(name, 0) + value
+    return pd.Series({name: float(total) for name, total in totals.items()}).sort_index()
+
+
+def rows_per_sec(fn, rewards_df: pd.DataFrame, prices) -> float:
+    start = time.perf_counter()
+    fn(rewards_df, prices, "bribes", "bribe_amount")
+    return len(rewards_df) / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    rewards_df, price_df = sample(rows)
+    truth = exact(rewards_df, price_df)
+    tokens = TokenRegistry(os.path.join(tempfile.mkdtemp(), "tokens.parquet"), read_params("params.yaml")["web3"]["token_abi"])
+    tokens.refresh({"data": price_df.to_dict("records")})
+    for label, fn, prices in [("loop", reward_amounts_loop, price_df), ("vectorized", reward_amounts, tokens)]:
+        result = fn(rewards_df, prices, "bribes", "bribe_amount").set_index("name")["bribe_amount"].sort_index()
+        error = ((result - truth).abs() / truth).max()
+        print(f"{label + ':':<12}{rows_per_sec(fn, rewards_df, prices):>14,.0f} rows/sec, max relative error {error:.2e}")
@@ -0,0 +1,53 @@
+# Rows/sec of the TVL inflow/outflow step in tvl_data.py, row-wise apply (previous code) vs utils.transforms.tvl_flows
+# Run from the repository root: python -m benchmarks.tvl_flows [rows]
+import sys
+import time
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from utils.transforms import TVL_COLUMNS, tvl_flows
+
+
+def tvl_flows_apply(tvl_df: pd.DataFrame) -> pd.DataFrame:
+    tvl_df = tvl_df.copy()
+    tvl_df['timestamp'] = pd.to_numeric(tvl_df['timestamp'])
+    tvl_df['datetime'] = pd.to_datetime(tvl_df['timestamp'], unit='s')
+    tvl_df['date'] = pd.to_datetime(tvl_df['timestamp'], unit='s').dt.date
+    tvl_df['amountUSD'] = pd.to_numeric(tvl_df['amountUSD'])
+    tvl_df["date"] = tvl_df["date"].apply(lambda date: datetime.strftime(date, "%Y-%m-%d"))
+    tvl_df.drop(['datetime'], axis=1, inplace=True)
+    tvl_df.sort_values("timestamp", ascending=True, inplace=True)
+    tvl_df['TVL_inflow'] = tvl_df.apply(lambda row: row['amountUSD'] if row['Tx Type'] == 'Mint' else 0, axis=1)
+    tvl_df['TVL_outflow'] = tvl_df.apply(lambda row: row['amountUSD'] if row['Tx Type'] == 'Burn' else 0, axis=1)
+    tvl_df['TVL_change'] = tvl_df.apply(lambda row: row['amountUSD'] if row['Tx Type'] == 'Mint' else -row['amountUSD'], axis=1)
+    return tvl_df[TVL_COLUMNS]
+
+
+def sample(rows: int) -> pd.DataFrame:
+    # Same shape as the subgraph rows collected by tvl_data.py: numbers arrive as strings
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        'timestamp': rng.integers(1700000000, 1710000000, rows).astype(str),
+        'amountUSD': rng.uniform(0, 1e5, rows).round(6).astype(str),
+        'transaction.id': [f"0x{i:064x}" for i in range(rows)],
+        'Tx Type': rng.choice(['Mint', 'Burn'], rows),
+        'Pool Name': rng.choice(['vAMM-WBNB/USDT', 'sAMM-USDT/USDC', 'aWBNB-THE'], rows),
+        'Pool Address': '0x0000000000000000000000000000000000000001',
+        'Pool Type': rng.choice(['Volatile', 'Stable', 'CL'], rows),
+    })
+
+
+def rows_per_sec(fn, df: pd.DataFrame) -> float:
+    start = time.perf_counter()
+    fn(df)
+    return len(df) / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    df = sample(rows)
+    before, after = tvl_flows_apply(df), tvl_flows(df)
+    assert before.astype(str).values.tolist() == after.astype(str).values.tolist()
+    print(f"{rows} rows")
+    print(f"apply:    {rows_per_sec(tvl_flows_apply, df):>14,.0f} rows/sec")
+    print(f"columnar: {rows_per_sec(tvl_flows, df):>14,.0f} rows/sec")
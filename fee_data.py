@@ -1,148 +1,80 @@
-import requests
-import pandas as pd
-import json
-import os
-import time
-from datetime import datetime, timezone
-from dateutil.relativedelta import relativedelta, TH
+import asyncio
 from application_logging.logger import logger
-import gspread
-from web3 import Web3
 from web3.middleware import validation
 from utils.helpers import read_params
+from utils.http_cache import get_cache
+from utils.pools import get_pools
+from utils.call_cache import CallCache, epoch_closed
+from utils.epochs import current_epoch, epoch_start
+from utils.multicall import Multicall, abi_contract, read_rewards
+from utils.rpc import AsyncRPCClient
+from utils.publisher import get_publisher
+from utils.rewards import reward_amounts, reward_rows
+from utils.store import Store
+from utils.tokens import get_tokens
+from utils.stages import stage_failed
 
 # Params
 params_path = 'params.yaml'
 config = read_params(params_path)
+store = Store.from_config(config)
+publisher = get_publisher()
+cache = get_cache(config)
+call_cache = CallCache.from_config(config)
+tokens = get_tokens(config)
 
 try:
     # Params Data
     subgraph = config["query"]["subgraph"]
-    id_data = config["files"]["new_id_data"]
     provider_url = config["web3"]["provider_url"]
     provider_urls = config["web3"]["provider_urls"]
     bribe_abi = config["web3"]["bribe_abi"]
-    epoch_csv = config["files"]["epoch_data"]
+    multicall_contract = config["web3"]["multicall_contract"]
+    multicall_abi = config["web3"]["multicall_abi"]
+    multicall_batch_size = config["web3"]["multicall_batch_size"]
     price_api = config["api"]["price_api"]
-    fee_csv = config["files"]["fee_data"]
     validation.METHODS_TO_VALIDATE = []
 
     # Pulling Bribe Data
     logger.info("Fee Data Started")
 
-    ids_df = pd.read_csv(id_data)
+    ids_df = get_pools(config, "new_id_data").frame(columns=["name", "fee_ca"])
 
-    # Get Epoch Timestamp
-    todayDate = datetime.utcnow()
-    if todayDate.isoweekday() == 4:
-        nextThursday = todayDate + relativedelta(weekday=TH(2))
-        my_time = datetime.min.time()
-        my_datetime = datetime.combine(nextThursday, my_time)
-        timestamp = int(my_datetime.replace(tzinfo=timezone.utc).timestamp())
-        print("Yes, The next Thursday date:", my_datetime, timestamp)
-    else:
-        nextThursday = todayDate + relativedelta(weekday=TH(0))
-        my_time = datetime.min.time()
-        my_datetime = datetime.combine(nextThursday, my_time)
-        timestamp = int(my_datetime.replace(tzinfo=timezone.utc).timestamp())
-        print("No, The next Thursday date:", my_datetime, timestamp)
+    # Epoch we are in (its rewards are rewardData keyed by the start of the next epoch)
+    epoch = current_epoch()
+    timestamp = epoch_start(epoch + 1)
+    print("Epoch:", epoch, "next epoch start:", timestamp)
 
-    # Read Epoch Data
-    epoch_data = pd.read_csv(epoch_csv)
-    epoch = epoch_data[epoch_data["timestamp"] == timestamp]["epoch"].values[0] - 1
-
-    # Pull Fees Web3
-    fees_list = []
-    for name, fee_ca in zip(ids_df["name"], ids_df["fee_ca"]):
-        if fee_ca == "0x0000000000000000000000000000000000000000":
-            continue
-        for rpc_endpoint in provider_urls:
-            try:
-                w3 = Web3(Web3.HTTPProvider(rpc_endpoint, request_kwargs={"timeout": 5}))
-
-                contract_address = fee_ca
-                contract_instance = w3.eth.contract(address=contract_address, abi=bribe_abi)
-    
-                rewardsListLength = contract_instance.functions.rewardsListLength().call()
-    
-                rewardTokens = []
-                for reward_num in range(rewardsListLength):
-                    rewardTokens.append(contract_instance.functions.rewardTokens(reward_num).call())
-    
-                for reward_addy in rewardTokens:
-                    rewarddata = contract_instance.functions.rewardData(reward_addy, timestamp).call()
-                    if rewarddata[1] > 0:
-                        fees_list.append({"name": name, "fees": rewarddata[1], "address": reward_addy})
-                break
-            except Exception as e:
-                logger.error(f"Error occurred while fetching fees from {rpc_endpoint} for {name}: {e}")
-
-    fee_df = pd.DataFrame(fees_list)
+    # Pull Prices
+    tokens.refresh(cache.get_json(price_api))
+
+    # Pull Fees Web3 (Multicall3 waves: lengths, tokens, reward data)
+    async def pull_rewards(addresses):
+        async with AsyncRPCClient.from_config(config) as client:
+            multicall = Multicall(client, multicall_contract, multicall_abi, multicall_batch_size, call_cache)
+            rewards = await read_rewards(multicall, abi_contract(bribe_abi), addresses, timestamp, final=epoch_closed(timestamp))
+            await tokens.resolve(multicall, [reward["address"] for contract_rewards in rewards for reward in contract_rewards])
+            logger.info(f"Fees read in {multicall.requests} RPC requests, {multicall.cached} calls from cache")
+            return rewards
+
+    rewards = asyncio.run(pull_rewards(ids_df["fee_ca"].tolist()))
+    fee_df = reward_rows(ids_df["name"], rewards, "fees")
     if fee_df.empty:
         raise Exception("Dataframe is empty")
-    fee_df["address"] = fee_df["address"].apply(str.lower)
-
-    # Pull Prices
-    response = requests.get(price_api)
-    pricelist = []
-    for i in response.json()["data"]:
-        pricelist.append([i["name"], i["address"], i["price"], i["decimals"]])
-
-    price_df = pd.DataFrame(pricelist, columns=["name", "address", "price", "decimals"])
 
     # Fee Amounts
-    fee_df = fee_df.merge(price_df[["address", "price", "decimals"]], on="address", how="left")
-    fee_df["fee_amount"] = fee_df["price"] * fee_df["fees"]
-
-    fee_amount = []
-    for dec, amt in zip(fee_df["decimals"], fee_df["fee_amount"]):
-        decimal = "1"
-        decimal = decimal.ljust(dec + 1, "0")
-        fee_amount.append((amt / int(decimal)))
-
-    fee_df["fee_amount"] = fee_amount
-
-    fee_df = fee_df.groupby(by="name")["fee_amount"].sum().reset_index()
+    fee_df = reward_amounts(fee_df, tokens, "fees", "fee_amount")
+    tokens.save()
     fee_df["epoch"] = epoch
 
     # Rewriting current Epoch's Fee Data
-    feeor = pd.read_csv(fee_csv)
-    drop_index = feeor[feeor["epoch"] == epoch].index
-    index_list = drop_index.to_list()
-    index_list = list(map(lambda x: x + 2, index_list))
-    df_values = fee_df.values.tolist()
+    store.replace("fee_data", fee_df, epoch)
     
     # Write to GSheets
-    credentials = os.environ["GKEY"]
-    credentials = json.loads(credentials)
-    gc = gspread.service_account_from_dict(credentials)
-
-    # Open a google sheet
-    sheetkey = config["gsheets"]["fee_data_sheet_key"]
-    gs = gc.open_by_key(sheetkey)
-
-    # Select a work sheet from its name
-    worksheet1 = gs.worksheet("Master")
-    if index_list != []:
-        worksheet1.delete_rows(index_list[0], index_list[-1])
-
-    retries, delay = 3, 30
-    for attempt in range(retries):
-        try:
-            gs = gc.open_by_key(sheetkey)
-            # Append to Worksheet
-            gs.values_append("Master", {"valueInputOption": "USER_ENTERED"}, {"values": df_values})
-            logger.error("Data successfully appended to Google Sheets.")
-            break  # Break the loop if successful
-        except Exception as e:
-            logger.error(f"Error occurred: {e}")
-            if attempt < retries - 1:
-                logger.error(f"Retrying in {delay} seconds... (Attempt {attempt + 2}/{retries})")
-                time.sleep(delay)  # Wait before retrying
-            else:
-                logger.error("All retries failed.")
-                raise  # Re-raise the exception if retries are exhausted
+    changes = publisher.publish(store, "fee_data", config["gsheets"]["fee_data_sheet_key"])
+    logger.error(f"Data successfully synced to Google Sheets: {changes}")
 
     logger.info("Fee Data Ended")
 except Exception as e:
     logger.error("Error occurred during Fee Data process. Error: %s" % e)
+    stage_failed(__file__, "Fee Data")
@@ -1,32 +1,24 @@
-import pandas as pd
-import json
-import os
-import time
-from datetime import datetime
 from application_logging.logger import logger
-import gspread
+from utils.epochs import epoch_of, now
 from utils.helpers import read_params
+from utils.publisher import get_publisher
+from utils.store import Store
+from utils.stages import stage_failed
 
 # Params
 params_path = 'params.yaml'
 config = read_params(params_path)
+store = Store.from_config(config)
+publisher = get_publisher()
 
 try:
-    # Params Data
-    epoch_daily_csv = config["files"]["epoch_daily_data"]
-    pair_data = config["files"]["pair_data_combined"]
-    fee_tvl_data_csv = config["files"]["fee_tvl_data"]
-
     # Epoch we are in
-    todayDate = datetime.utcnow().date()
-    epoch_data = pd.read_csv(epoch_daily_csv)
-    epoch_data["date"] = epoch_data["date"].apply(lambda date: datetime.strptime(date, "%d-%m-%Y").date())
-    current_epoch = epoch_data[epoch_data["date"] <= todayDate]["epoch"].max()
+    current_epoch = epoch_of(now())
 
     # Pulling Fee TVL Data
     logger.info("Fee TVL Data Started")
 
-    pair_df = pd.read_csv(pair_data)
+    pair_df = store.read("pair_data_combined", columns=["epoch", "fee", "reserveUSD"])
     if pair_df.empty:
         raise Exception("Dataframe is empty")
     grouped_df = pair_df.groupby('epoch')[['fee', 'reserveUSD']].sum()
@@ -37,43 +29,13 @@ try:
     grouped_df.sort_values("epoch", ascending=True, inplace=True)
     grouped_df = grouped_df[grouped_df['epoch']>=current_epoch-2]
 
-    fee_tvl_data_old = pd.read_csv(fee_tvl_data_csv)
-    drop_index = fee_tvl_data_old[fee_tvl_data_old['epoch']>=current_epoch-2].index
-    index_list = drop_index.to_list()
-    index_list = list(map(lambda x: x + 2, index_list))
-    df_values = grouped_df.values.tolist()
+    store.replace("fee_tvl_data", grouped_df, current_epoch - 2)
 
     # Write to GSheets
-    credentials = os.environ["GKEY"]
-    credentials = json.loads(credentials)
-    gc = gspread.service_account_from_dict(credentials)
-
-    # Open a google sheet
-    sheetkey = config["gsheets"]["fee_tvl_data_sheet_key"]
-    gs = gc.open_by_key(sheetkey)
-
-    # Select a work sheet from its name
-    worksheet1 = gs.worksheet("Master")
-    if index_list != []:
-        worksheet1.delete_rows(index_list[0], index_list[-1])
-
-    retries, delay = 3, 30
-    for attempt in range(retries):
-        try:
-            gs = gc.open_by_key(sheetkey)
-            # Append to Worksheet
-            gs.values_append("Master", {"valueInputOption": "USER_ENTERED"}, {"values": df_values})
-            logger.error("Data successfully appended to Google Sheets.")
-            break  # Break the loop if successful
-        except Exception as e:
-            logger.error(f"Error occurred: {e}")
-            if attempt < retries - 1:
-                logger.error(f"Retrying in {delay} seconds... (Attempt {attempt + 2}/{retries})")
-                time.sleep(delay)  # Wait before retrying
-            else:
-                logger.error("All retries failed.")
-                raise  # Re-raise the exception if retries are exhausted
+    changes = publisher.publish(store, "fee_tvl_data", config["gsheets"]["fee_tvl_data_sheet_key"])
+    logger.error(f"Data successfully synced to Google Sheets: {changes}")
 
     logger.info("Fee TVL Data Ended")
 except Exception as e:
-    logger.error("Error occurred during TVL Data process. Error: %s" % e, exc_info=True)
\ No newline at end of file
+    logger.error("Error occurred during Fee TVL Data process. Error: %s" % e, exc_info=True)
+    stage_failed(__file__, "Fee TVL Data")
\ No newline at end of file
@@ -2,9 +2,11 @@ import requests
 import pandas as pd
 import yaml
 from application_logging.logger import logger
-import itertools
 from web3 import Web3
 from web3.middleware import validation
+from utils.subgraph import Records, make_session, paginate
+from utils.id_registry import load_registry, new_pair_rows, possibly_killed, unseen
+from utils.pools import pool_lists
 
 
 # Params
@@ -25,54 +27,53 @@ try:
     # Params Data
     subgraph = config["query"]["subgraph"]
     id_data_query = config["query"]["id_data_query"]
+    fetch_timeout = config["fetch"]["timeout"]
     provider_url = config["web3"]["provider_url"]
     amm_abi = config["web3"]["amm_abi"]
     ve_contract = config["web3"]["ve_contract"]
     voter_abi = config["web3"]["voter_abi"]
+    fusion_api = config["api"]["fusion_api"]
+    incremental = config["registry"]["incremental"]
 
     # Request
-    ids_df = pd.DataFrame()
-    for i in itertools.count(0, 100):
-        id_data_query["variables"]["skip"] = i
-        response = requests.post(url=subgraph, json=id_data_query)
-        data = response.json()["data"]["pairs"]
-
-        if data == []:
-            break
-        else:
-            temp_df = pd.json_normalize(data)
-            ids_df = pd.concat([ids_df, temp_df], axis=0)
-    ids_df.reset_index(drop=True, inplace=True)
+    records = Records()
+    for data in paginate(make_session(1), subgraph, id_data_query, lambda data: data["pairs"], timeout=fetch_timeout):
+        records.extend(data)
+    ids_df = records.frame()
+
+    # Registry diff (only unseen pairs are resolved on-chain, and pairs whose gauge no
+    # longer matches the Thena API are re-verified against the voter)
+    registry_columns = ["name", "address", "type", "gauges", "bribe_ca"]
+    if incremental:
+        registry_df = load_registry("data/ids_data.csv", registry_columns).drop_duplicates("address")
+        fusion_data = requests.get(url=fusion_api).json()["data"]
+    else:
+        registry_df = pd.DataFrame(columns=registry_columns)
+        fusion_data = []
+    addresses = [Web3.toChecksumAddress(address) for address in ids_df["id"]]
+    new_pairs = unseen(registry_df, addresses)
+    killed = possibly_killed(registry_df, fusion_data)
+    recheck_pairs = [address for address in addresses if address in killed]
+    logger.info(f"ID Data registry: {len(addresses) - len(new_pairs)} known pairs, {len(new_pairs)} new, {len(recheck_pairs)} to re-verify")
 
     # Web3
     validation.METHODS_TO_VALIDATE = []
     w3 = Web3(Web3.HTTPProvider(provider_url, request_kwargs={"timeout": 60}))
 
-    names = []
-    for address in ids_df["id"]:
-        address = w3.toChecksumAddress(address)
+    symbols = {}
+    for address in new_pairs:
         contract_instance = w3.eth.contract(address=address, abi=amm_abi)
-        names.append({"name": contract_instance.functions.symbol().call(), "address": address})
+        symbols[address] = contract_instance.functions.symbol().call()
 
-    ids_df = pd.DataFrame(names)
-    ids_df[["type", "pair"]] = ids_df["name"].str.split("-", 1, expand=True)
-    ids_df.drop(["pair"], axis=1, inplace=True)
-
-    xcad = ["0x8dDc543CB4Be74D8A4979DcCFC79C18BdEFd2Dad", "0x3Ec80A1f547ee6FD5D7FC0DC0C1525Ff343D087C", "0xe2d25A87e97a1016c35F736Ea77A4d6Bd1919E74", "0x46C69a989DC56747F007acfA4d6BC7c9FA8137bF", "0x6190E79064213E6A2997355153f57904FB4910C3", "0x3f4d5c667D918DcE84c89cC63998776d21081089", "0xd9F7096625B65Ac37c09d05c1c4548edfcCe9fBE", "0x3A569CeF2c6445d198F90d3D87DbFa3C7977cEb2", "0x2127bd04dDc9d8d1a4fAfCd96b4D4D81153831BC", "0xe200B5B3F08d1254d05d8797FFA1f99730C0025c", "0x6c03177eb78EbDe271B24FD6E446b301db1AEdb1", "0x7c7Ed76Dd95ffA7b899EE8Cc61aA8362d58aC420"]
-    for pool in xcad:
-        index = ids_df[ids_df["address"] == pool].index
-        ids_df.loc[index, "name"] = ids_df.loc[index, "name"].values[0] + " OLD"
+    new_df = new_pair_rows(symbols, pool_lists(config)["old"])
 
     contract_instance = w3.eth.contract(address=ve_contract, abi=voter_abi)
-    gauges = []
-    bribe_ca = []
-    for address in ids_df["address"]:
-        address = w3.toChecksumAddress(address)
+    ids_df = pd.concat([registry_df, new_df], axis=0).set_index("address").reindex(addresses)
+    for address in new_pairs + recheck_pairs:
         gauge = contract_instance.functions.gauges(address).call()
-        gauges.append(gauge)
-        bribe_ca.append(contract_instance.functions.external_bribes(gauge).call())
-    ids_df["gauges"] = gauges
-    ids_df["bribe_ca"] = bribe_ca
+        ids_df.loc[address, "gauges"] = gauge
+        ids_df.loc[address, "bribe_ca"] = contract_instance.functions.external_bribes(gauge).call()
+    ids_df = ids_df.reset_index()[registry_columns]
 
     ids_df.to_csv("data/ids_data.csv", index=False)
 
@@ -1,14 +1,24 @@
+import os
 import requests
 import pandas as pd
 from application_logging.logger import logger
-import itertools
+import asyncio
 from web3 import Web3
 from web3.middleware import validation
 from utils.helpers import read_params
+from utils.inputs import read_input, share_input
+from utils.pools import pool_lists, share_pools
+from utils.id_registry import load_registry, new_pair_rows, possibly_killed, suffix_duplicates, unseen
+from utils.multicall import Call, Multicall, abi_contract
+from utils.rpc import AsyncRPCClient
+from utils.subgraph import Records, make_session, paginate
+from utils.tokens import get_tokens
+from utils.stages import stage_failed
 
 # Params
 params_path = 'params.yaml'
 config = read_params(params_path)
+tokens = get_tokens(config)
 
 try:
     logger.info("ID Data Started")
@@ -16,6 +26,7 @@ try:
     # Params Data
     subgraph = config["query"]["subgraph"]
     id_data_query = config["query"]["id_data_query"]
+    fetch_timeout = config["fetch"]["timeout"]
     provider_url = config["web3"]["provider_url"]
     amm_abi = config["web3"]["amm_abi"]
     ve_contract = config["web3"]["ve_contract"]
@@ -24,119 +35,153 @@ try:
     cl_gauges_abi = config["web3"]["cl_gauges_abi"]
     cl_gauge_abi = config["web3"]["cl_gauge_abi"]
     cl_token_abi = config["web3"]["cl_token_abi"]
-    algebra_data = config["files"]["algebra_data"]
     algb_abi = config['web3']['algb_abi']
-    token_abi = config['web3']['token_abi']
+    multicall_contract = config["web3"]["multicall_contract"]
+    multicall_abi = config["web3"]["multicall_abi"]
+    id_batch_size = config["web3"]["id_batch_size"]
+    fusion_api = config["api"]["fusion_api"]
+    registry_csv = config["files"]["id_data"]
+    incremental = config["registry"]["incremental"]
+    excluded_csv = config["registry"]["excluded_cl"]
+    excluded_bribe = '0x53886c1C70627DaFC42258dBF9EC5D4D4CB0080e'
     validation.METHODS_TO_VALIDATE = []
 
     # Request
-    ids_df = pd.DataFrame()
-    for i in itertools.count(0, 100):
-        id_data_query["variables"]["skip"] = i
-        response = requests.post(url=subgraph, json=id_data_query)
-        data = response.json()["data"]["pairs"]
-
-        if data == []:
-            break
-        else:
-            temp_df = pd.json_normalize(data)
-            ids_df = pd.concat([ids_df, temp_df], axis=0)
-    ids_df.reset_index(drop=True, inplace=True)
-
-    # Web3
-    w3 = Web3(Web3.HTTPProvider(provider_url, request_kwargs={"timeout": 5}))
+    records = Records()
+    for data in paginate(make_session(1), subgraph, id_data_query, lambda data: data["pairs"], timeout=fetch_timeout):
+        records.extend(data)
+    ids_df = records.frame()
+
+    # Registry diff (only unseen pairs and CL gauges are resolved on-chain, and pairs whose
+    # gauge no longer matches the Thena API are re-verified against the voter)
+    base_columns = ['name', 'address', 'type', 'gauges', 'bribe_ca', 'fee_ca', 'algebra_pool']
+    if incremental:
+        registry_df = load_registry(registry_csv, base_columns)
+        if os.path.exists(excluded_csv):
+            registry_df = pd.concat([registry_df, load_registry(excluded_csv, base_columns)], axis=0, ignore_index=True)
+        fusion_data = requests.get(url=fusion_api).json()['data']
+    else:
+        registry_df = pd.DataFrame(columns=base_columns)
+        fusion_data = []
+    pair_registry = registry_df[registry_df['type'] != 'CL'].drop_duplicates('address').set_index('address')
+    cl_registry = registry_df[registry_df['type'] == 'CL'].drop_duplicates('gauges').set_index('gauges')
+
+    addresses = [Web3.toChecksumAddress(address) for address in ids_df["id"]]
+    new_pairs = unseen(pair_registry.reset_index(), addresses)
+    killed = possibly_killed(pair_registry.reset_index(), fusion_data)
+    recheck_pairs = [address for address in addresses if address in killed]
+    logger.info(f"ID Data registry: {len(addresses) - len(new_pairs)} known pairs, {len(new_pairs)} new, {len(recheck_pairs)} to re-verify")
+
+    # Web3 (each discovery stage is one Multicall3 wave, independent stages run concurrently)
+    async def discover_pairs(new_pairs, recheck_pairs):
+        async with AsyncRPCClient.from_config(config) as client:
+            multicall = Multicall(client, multicall_contract, multicall_abi, id_batch_size)
+            amm_contract = abi_contract(amm_abi)
+            voter_contract = abi_contract(voter_abi)
+            cl_gauges_instance = abi_contract(cl_gauges_abi)
+            cl_gauge_contract = abi_contract(cl_gauge_abi)
+            cl_token_contract = abi_contract(cl_token_abi)
+            lookups = new_pairs + recheck_pairs
+
+            # Pair symbols, voter gauges and the CL gauge list
+            symbols, gauges, (cl_gauges,) = await asyncio.gather(
+                multicall.aggregate([Call(address, amm_contract, "symbol") for address in new_pairs], require_success=True),
+                multicall.aggregate([Call(ve_contract, voter_contract, "gauges", (address,)) for address in lookups], require_success=True),
+                multicall.aggregate([Call(cl_gauges_contract, cl_gauges_instance, "gauges")], require_success=True),
+            )
+            new_cl_gauges = [gauge for gauge in cl_gauges if gauge not in cl_registry.index]
+
+            # Voter bribes per pair gauge, TOKEN and bribes per CL gauge
+            bribes, fees, tokens, cl_bribes, cl_fees = await asyncio.gather(
+                multicall.aggregate([Call(ve_contract, voter_contract, "external_bribes", (gauge,)) for gauge in gauges], require_success=True),
+                multicall.aggregate([Call(ve_contract, voter_contract, "internal_bribes", (gauge,)) for gauge in gauges], require_success=True),
+                multicall.aggregate([Call(gauge, cl_gauge_contract, "TOKEN") for gauge in new_cl_gauges], require_success=True),
+                multicall.aggregate([Call(gauge, cl_gauge_contract, "external_bribe") for gauge in new_cl_gauges], require_success=True),
+                multicall.aggregate([Call(gauge, cl_gauge_contract, "internal_bribe") for gauge in new_cl_gauges], require_success=True),
+            )
+
+            # CL token symbols and algebra pools
+            token_symbols, algebra_pools = await asyncio.gather(
+                multicall.aggregate([Call(token, cl_token_contract, "symbol") for token in tokens], require_success=True),
+                multicall.aggregate([Call(token, cl_token_contract, "pool") for token in tokens], require_success=True),
+            )
+            logger.info(f"ID Data discovery done in {multicall.requests} RPC requests")
+
+        pairs = {
+            "symbols": dict(zip(new_pairs, symbols)),
+            "gauges": {address: (gauge, bribe, fee) for address, gauge, bribe, fee in zip(lookups, gauges, bribes, fees)},
+        }
+        cl = pd.DataFrame(
+            {'name' : [symbol + " " + str(token[-4:]) for symbol, token in zip(token_symbols, tokens)],
+            'address' : tokens,
+            'gauges' : new_cl_gauges,
+            'bribe_ca' : cl_bribes,
+            'fee_ca' : cl_fees,
+            'algebra_pool' : algebra_pools}
+        ).set_index('gauges')
+        return pairs, cl, cl_gauges
+
+    async def discover_algebra_names(pools):
+        async with AsyncRPCClient.from_config(config) as client:
+            multicall = Multicall(client, multicall_contract, multicall_abi, id_batch_size)
+            algb_contract = abi_contract(algb_abi)
+            token0s, token1s = await asyncio.gather(
+                multicall.aggregate([Call(pool, algb_contract, "token0") for pool in pools]),
+                multicall.aggregate([Call(pool, algb_contract, "token1") for pool in pools]),
+            )
+            # Symbols come from the token registry, only tokens it has not seen are read on chain
+            await tokens.resolve(multicall, [token for token in token0s + token1s if token is not None])
+        tokens.save()
+        names = []
+        for pool, name0, name1 in zip(pools, tokens.symbols([token or "" for token in token0s]), tokens.symbols([token or "" for token in token1s])):
+            if name0 is None or name1 is None:
+                logger.error("Error occurred during ID Data process. Pool: %s Error: could not resolve token symbols" % pool)
+                names.append(None)
+            else:
+                names.append(f"{name0}-{name1}")
+        return names
 
-    names = []
-    for address in ids_df["id"]:
-        address = w3.toChecksumAddress(address)
-        contract_instance = w3.eth.contract(address=address, abi=amm_abi)
-        names.append({"name": contract_instance.functions.symbol().call(), "address": address})
+    pairs, new_cl_df, cl_gauges = asyncio.run(discover_pairs(new_pairs, recheck_pairs))
 
-    ids_df = pd.DataFrame(names)
-    ids_df[["type", "pair"]] = ids_df["name"].str.split(pat="-", n=1, expand=True)
-    ids_df.drop(["pair"], axis=1, inplace=True)
+    # Solidly Pools (new pairs get their name from symbol(), known pairs keep the registry row)
+    new_df = new_pair_rows(pairs["symbols"], pool_lists(config)["old"])
 
-    xcad = ["0x8dDc543CB4Be74D8A4979DcCFC79C18BdEFd2Dad", "0x3Ec80A1f547ee6FD5D7FC0DC0C1525Ff343D087C", "0xe2d25A87e97a1016c35F736Ea77A4d6Bd1919E74", "0x46C69a989DC56747F007acfA4d6BC7c9FA8137bF", "0x6190E79064213E6A2997355153f57904FB4910C3", "0x3f4d5c667D918DcE84c89cC63998776d21081089", "0xd9F7096625B65Ac37c09d05c1c4548edfcCe9fBE", "0x3A569CeF2c6445d198F90d3D87DbFa3C7977cEb2", "0x2127bd04dDc9d8d1a4fAfCd96b4D4D81153831BC", "0xe200B5B3F08d1254d05d8797FFA1f99730C0025c", "0x6c03177eb78EbDe271B24FD6E446b301db1AEdb1", "0x7c7Ed76Dd95ffA7b899EE8Cc61aA8362d58aC420"]
-    for pool in xcad:
-        index = ids_df[ids_df["address"] == pool].index
-        ids_df.loc[index, "name"] = ids_df.loc[index, "name"].values[0] + " OLD"
+    known_df = pair_registry.reset_index()[["name", "address", "type", "gauges", "bribe_ca", "fee_ca"]]
+    ids_df = pd.concat([known_df, new_df], axis=0).set_index("address").reindex(addresses)
+    for address, (gauge, bribe, fee) in pairs["gauges"].items():
+        ids_df.loc[address, ["gauges", "bribe_ca", "fee_ca"]] = [gauge, bribe, fee]
+    ids_df = ids_df.reset_index()[["name", "address", "type", "gauges", "bribe_ca", "fee_ca"]]
 
     # Duplicates
-    duplicate_names = ids_df[ids_df['name'].duplicated(keep=False)]
-    ids_df.loc[duplicate_names.index, 'name'] = (duplicate_names['name'] + " " + duplicate_names['address'].str[-4:])
-
-    # Solidly Pools
-    contract_instance = w3.eth.contract(address=ve_contract, abi=voter_abi)
-    gauges = []
-    bribe_ca = []
-    fee_ca = []
-    for address in ids_df["address"]:
-        address = w3.toChecksumAddress(address)
-        gauge = contract_instance.functions.gauges(address).call()
-        gauges.append(gauge)
-        bribe_ca.append(contract_instance.functions.external_bribes(gauge).call())
-        fee_ca.append(contract_instance.functions.internal_bribes(gauge).call())
-    ids_df["gauges"] = gauges
-    ids_df["bribe_ca"] = bribe_ca
-    ids_df["fee_ca"] = fee_ca
-
-    # CL Pools
-    contract_instance = w3.eth.contract(address=cl_gauges_contract, abi=cl_gauges_abi)
-    cl_gauges = contract_instance.functions.gauges().call()
-    tokens = []
-    bribe_ca = []
-    fee_ca = []
-    for gauge in cl_gauges:
-        contract_instance = w3.eth.contract(address=gauge, abi=cl_gauge_abi)
-        tokens.append(contract_instance.functions.TOKEN().call())
-        bribe_ca.append(contract_instance.functions.external_bribe().call())
-        fee_ca.append(contract_instance.functions.internal_bribe().call())
-    name = []
-    algebra_pool = []
-    for token in tokens:
-        contract_instance = w3.eth.contract(address=token, abi=cl_token_abi)
-        name.append(contract_instance.functions.symbol().call() + " " + str(token[-4:]))
-        algebra_pool.append(contract_instance.functions.pool().call())
-        
-
-    cl_df = pd.DataFrame(
-        {'name' : name,
-        'address' : tokens,
-        'gauges' : cl_gauges,
-        'bribe_ca' : bribe_ca,
-        'fee_ca' : fee_ca,
-        'algebra_pool' : algebra_pool}
-    )
+    ids_df['name'] = suffix_duplicates(ids_df)
+
+    # CL Pools (rows of every listed gauge, resolved only when the gauge is new)
+    cl_df = pd.concat([cl_registry[['name', 'address', 'bribe_ca', 'fee_ca', 'algebra_pool']], new_cl_df], axis=0)
+    cl_df = cl_df.reindex(cl_gauges).rename_axis('gauges').reset_index()
     cl_df['type'] = "CL"
     cl_df = cl_df[['name', 'address', 'type', 'gauges', 'bribe_ca', 'fee_ca', 'algebra_pool']]
-    cl_df = cl_df[cl_df['bribe_ca'] != '0x53886c1C70627DaFC42258dBF9EC5D4D4CB0080e']
+    # Excluded gauges stay out of the ID table but are kept beside it, so they are not resolved again next run
+    excluded = cl_df['bribe_ca'] == excluded_bribe
+    os.makedirs(os.path.dirname(excluded_csv), exist_ok=True)
+    cl_df[excluded].to_csv(excluded_csv, index=False)
+    cl_df = cl_df[~excluded]
     ids_df = pd.concat([ids_df, cl_df], axis=0)
     ids_df.reset_index(drop=True, inplace=True)
 
     # Adding algebra pool names
-    algebra_df = pd.read_csv(algebra_data)
+    algebra_df = read_input(config, "algebra_data")
     ids_df = ids_df.merge(algebra_df, how='left', on='algebra_pool')
     filtered_pools = ids_df[(ids_df['algebra_name'].isna()) & (ids_df['type'] == 'CL')]['algebra_pool'].drop_duplicates().tolist()
 
     algebra_names = []
-    for algebra_pool in filtered_pools:
-        try:
-            web3 = Web3(Web3.HTTPProvider(provider_url, request_kwargs={'timeout': 5}))
-            contract = web3.eth.contract(address=Web3.toChecksumAddress(algebra_pool), abi=algb_abi)
-            token0 = contract.functions.token0().call()
-            token1 = contract.functions.token1().call()
-            contract_token0 = web3.eth.contract(address=Web3.toChecksumAddress(token0), abi=token_abi)
-            contract_token1 = web3.eth.contract(address=Web3.toChecksumAddress(token1), abi=token_abi)
-            name0 = contract_token0.functions.symbol().call()
-            name1 = contract_token1.functions.symbol().call()
-            algebra_names.append(f"{name0}-{name1}")
-        except Exception as e:
-            logger.error("Error occurred during ID Data process. Pool: %s Error: %s" % (algebra_pool, e), exc_info=True)
-            algebra_names.append(None)
+    if filtered_pools:
+        algebra_names = asyncio.run(discover_algebra_names([Web3.toChecksumAddress(pool) for pool in filtered_pools]))
 
     for pool, name in zip(filtered_pools, algebra_names):
         algebra_df.loc[algebra_df['algebra_pool'] == pool, 'algebra_name'] = name
         ids_df.loc[ids_df['algebra_pool'] == pool, 'algebra_name'] = name
+    new_pools = [{'algebra_name': name, 'algebra_pool': pool} for pool, name in zip(filtered_pools, algebra_names) if name is not None and pool not in set(algebra_df['algebra_pool'])]
+    algebra_df = pd.concat([algebra_df, pd.DataFrame(new_pools, columns=['algebra_name', 'algebra_pool'])], axis=0, ignore_index=True)
 
     # Name Fix and ALM Type
     def replace_names(row):
@@ -159,7 +204,11 @@ try:
 
     ids_df.to_csv("data/ids_data_v2.csv", index=False)
     algebra_df.to_csv("data/algebra_data.csv", index=False)
+    share_input("id_data", "data/ids_data_v2.csv")
+    share_pools(config, "id_data")
+    share_input("algebra_data", "data/algebra_data.csv")
 
     logger.info("ID Data Ended")
 except Exception as e:
     logger.error("Error occurred during ID Data process. Error: %s" % e, exc_info=True)
+    stage_failed(__file__, "ID Data")
@@ -5,6 +5,9 @@ from web3 import Web3
 from web3.middleware import validation
 import os, sys
 from utils.helpers import read_params
+from utils.inputs import read_input, share_input
+from utils.pools import share_pools
+from utils.stages import stage_failed
 
 # Params
 params_path = 'params.yaml'
@@ -14,7 +17,6 @@ try:
     logger.info("ID Data Started")
 
     # Params Data
-    old_data = config["files"]["id_data"]
     provider_url = config["web3"]["provider_url"]
     provider_urls = config["web3"]["provider_urls"]
     id_abi = config["web3"]["id_abi"]
@@ -22,7 +24,7 @@ try:
     validation.METHODS_TO_VALIDATE = []
 
     # Old Data
-    id_df_old = pd.read_csv(old_data)
+    id_df_old = read_input(config, "id_data")
     id_df_old['address'] = id_df_old['address'].str.lower()
 
     # New Data
@@ -36,9 +38,12 @@ try:
     web3 = Web3(Web3.HTTPProvider(provider_urls[0], request_kwargs={'timeout': 2}))
     id_df['address'] = id_df['address'].apply(lambda x: web3.toChecksumAddress(x))
     id_df.to_csv("data/ids_data_v3.csv", index=False)
+    share_input("new_id_data", "data/ids_data_v3.csv")
+    share_pools(config, "new_id_data")
 
     logger.info("ID Data Ended")
 except Exception as e:
     exc_type, exc_obj, exc_tb = sys.exc_info()
     fname = os.path.split(exc_tb.tb_frame.f_code.co_filename)[1]
-    logger.error("Error occurred during ID Data process. Error: %s" % e, exc_info=True)
\ No newline at end of file
+    logger.error("Error occurred during ID Data process. Error: %s" % e, exc_info=True)
+    stage_failed(__file__, "ID Data")
\ No newline at end of file
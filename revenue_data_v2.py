@@ -1,31 +1,41 @@
 import pandas as pd
 import numpy as np
-import json
 import os
-import time
 from application_logging.logger import logger
-import gspread
-from gspread_dataframe import set_with_dataframe
 from utils.helpers import read_params
+from utils.pools import get_pools
+from utils.publisher import get_publisher
+from utils.revenue import EpochState, epoch_fingerprints
+from utils.store import Store
+from utils.stages import stage_failed
 
 # Params
 params_path = 'params.yaml'
 config = read_params(params_path)
+store = Store.from_config(config)
+publisher = get_publisher()
+state = EpochState(os.path.join(config["revenue"]["state_path"], "revenue_data_v2.parquet"))
 
 try:
     logger.info("Revenue Data Started")
 
-    # Params Data
-    id_data = config['files']['id_data']
-    pair_data = config["files"]["pair_data_combined"]
-    bribe_data = config["files"]["bribe_data"]
-    emissions_data = config["files"]["emissions_data"]
-
     # Read Data
-    ids_df = pd.read_csv(id_data)
-    pair_df = pd.read_csv(pair_data)
-    bribe_df = pd.read_csv(bribe_data)
-    emissions_df = pd.read_csv(emissions_data, thousands=r',')
+    ids_df = get_pools(config, "id_data").frame(columns=['name', 'new_name', 'alm_type'])
+    pair_df = store.read("pair_data_combined", columns=["epoch", "algebra_name", "fee"])
+    bribe_df = store.read("bribe_data")
+    emissions_df = store.read("emissions_data")
+
+    # Changed Epochs (only epochs whose inputs changed are recomputed; the latest epoch is still open and is left out)
+    fingerprints = epoch_fingerprints([(pair_df, 0), (bribe_df, 0), (bribe_df, 1), (emissions_df, 0)], ids_df[['name', 'new_name', 'alm_type']])
+    fingerprints = fingerprints.drop(fingerprints.index.max())
+    if config["revenue"]["incremental"]:
+        epochs, removed, full = state.diff(fingerprints)
+    else:
+        epochs, removed, full = list(fingerprints.index), [], True
+    logger.info(f"Revenue Data: {len(epochs)} of {len(fingerprints)} epochs to recompute, {len(removed)} to remove")
+    pair_df = pair_df[pair_df["epoch"].isin(epochs)]
+    bribe_df = bribe_df[bribe_df["epoch"].isin(epochs) | (bribe_df["epoch"] + 1).isin(epochs)]
+    emissions_df = emissions_df[emissions_df["epoch"].isin(epochs)]
     
     # Data Wrangling
     def extract_name(name):
@@ -53,44 +63,18 @@ try:
     final_df = pd.merge(df, emissions_df, on=["epoch", "new_name"], how="outer")
     final_df.replace(np.nan, 0, inplace=True)
     final_df.sort_values(by="epoch", axis=0, ignore_index=True, inplace=True) 
-    latest_epoch = final_df["epoch"].iloc[-1]
-    latest_data_index = final_df[final_df["epoch"] == latest_epoch].index
-    final_df.drop(latest_data_index, inplace=True)
+    final_df = final_df[final_df["epoch"].isin(epochs)]
+    if full:
+        store.write("revenue_data_v2", final_df)
+    else:
+        store.replace_keys("revenue_data_v2", final_df, epochs + removed)
+    state.save(fingerprints)
 
     # Write to GSheets
-    credentials = os.environ["GKEY"]
-    credentials = json.loads(credentials)
-    gc = gspread.service_account_from_dict(credentials)
-
-    # Open a google sheet
-    sheetkey = config["gsheets"]["revenue_data_v2_sheet_key"]
-
-    retries, delay = 3, 30
-    for attempt in range(retries):
-        try:
-            gs = gc.open_by_key(sheetkey)
-            # Select a work sheet from its name
-            worksheet1 = gs.worksheet("Master")
-            worksheet1.clear()
-            # Add to Worksheet
-            set_with_dataframe(
-                worksheet=worksheet1,
-                dataframe=final_df,
-                include_index=False,
-                include_column_header=True,
-                resize=True,
-            )
-            logger.error("Data successfully added to Google Sheets.")
-            break  # Break the loop if successful
-        except Exception as e:
-            logger.error(f"Error occurred: {e}")
-            if attempt < retries - 1:
-                logger.error(f"Retrying in {delay} seconds... (Attempt {attempt + 2}/{retries})")
-                time.sleep(delay)  # Wait before retrying
-            else:
-                logger.error("All retries failed.")
-                raise  # Re-raise the exception if retries are exhausted
+    changes = publisher.publish(store, "revenue_data_v2", config["gsheets"]["revenue_data_v2_sheet_key"])
+    logger.error(f"Data successfully synced to Google Sheets: {changes}")
 
     logger.info("Revenue Data Ended")
 except Exception as e:
     logger.error("Error occurred during Revenue Data process. Error: %s" % e)
+    stage_failed(__file__, "Revenue Data")
@@ -0,0 +1,42 @@
+import pandas as pd
+import pytest
+from backfill import epochs_to_fill, filled_frames
+from utils.store import Store
+
+DATASETS = {"bribe_data": {"key": "epoch", "partition": "epoch", "row_key": ["epoch", "name"]}}
+
+
+def test_fills_only_missing_epochs(tmp_path):
+    store = Store(str(tmp_path), DATASETS)
+    store.write("bribe_data", pd.DataFrame({"epoch": [3, 3, 5], "name": ["a", "b", "a"], "bribe_amount": [1.0, 2.0, 3.0]}))
+    assert epochs_to_fill(store, "bribe_data", [2, 3, 4, 5, 6]) == [2, 4, 6]
+    assert epochs_to_fill(store, "bribe_data", [3, 5]) == []
+
+
+def test_reprice_fills_every_epoch(tmp_path):
+    store = Store(str(tmp_path), DATASETS)
+    store.write("bribe_data", pd.DataFrame({"epoch": [3], "name": ["a"], "bribe_amount": [1.0]}))
+    assert epochs_to_fill(store, "bribe_data", [2, 3, 4], reprice=True) == [2, 3, 4]
+
+
+def test_filled_epochs_keep_stored_ones(tmp_path):
+    store = Store(str(tmp_path), DATASETS)
+    store.write("bribe_data", pd.DataFrame({"epoch": [3], "name": ["a"], "bribe_amount": [1.0]}))
+    epochs = epochs_to_fill(store, "bribe_data", [2, 3, 4])
+    store.replace_keys("bribe_data", pd.DataFrame({"epoch": [2, 4], "name": ["a", "a"], "bribe_amount": [9.0, 9.0]}), epochs)
+    df = store.read("bribe_data").sort_values("epoch")
+    assert df["epoch"].tolist() == [2, 3, 4]
+    assert df["bribe_amount"].tolist() == [9.0, 1.0, 9.0]
+
+
+def test_empty_epochs_are_skipped(tmp_path):
+    store = Store(str(tmp_path), DATASETS)
+    store.write("bribe_data", pd.DataFrame({"epoch": [2, 3], "name": ["a", "a"], "bribe_amount": [1.0, 2.0]}))
+    frames = filled_frames("bribe_data", {2: pd.DataFrame(), 3: pd.DataFrame({"epoch": [3], "name": ["b"], "bribe_amount": [9.0]})})
+    assert list(frames) == [3]
+    # A repriced epoch that came back empty keeps its stored rows
+    store.replace_keys("bribe_data", pd.concat(frames.values(), ignore_index=True), list(frames))
+    df = store.read("bribe_data").sort_values("epoch")
+    assert df[["epoch", "name"]].values.tolist() == [[2, "a"], [3, "b"]]
+    with pytest.raises(Exception):
+        filled_frames("bribe_data", {2: pd.DataFrame()})
@@ -0,0 +1,34 @@
+import os
+from datetime import datetime
+import pandas as pd
+from utils.epochs import day_timestamp, epoch_of, epoch_start, epoch_starts, epochs_between, epochs_of
+
+DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+
+
+def calendar(name):
+    df = pd.read_csv(os.path.join(DATA, name))
+    df["day"] = [datetime.strptime(day, "%d-%m-%Y") for day in df["date"]]
+    return df
+
+
+def test_epoch_of_matches_epoch_daily_csv():
+    df = calendar("epoch_daily.csv")
+    assert [day_timestamp(day) for day in df["day"]] == df["timestamp"].tolist()
+    assert [epoch_of(timestamp) for timestamp in df["timestamp"]] == df["epoch"].tolist()
+    assert epochs_of(df["timestamp"].to_numpy()).tolist() == df["epoch"].tolist()
+    # Last second of each day is still in the same epoch
+    assert epochs_of(df["timestamp"].to_numpy() + 86399).tolist() == df["epoch"].tolist()
+
+
+def test_epoch_start_matches_epoch_csv():
+    df = calendar("epoch.csv")
+    assert [epoch_start(epoch) for epoch in df["epoch"]] == df["timestamp"].tolist()
+    assert epoch_starts(df["epoch"].to_numpy()).tolist() == df["timestamp"].tolist()
+    assert [day_timestamp(day) for day in df["day"]] == df["timestamp"].tolist()
+
+
+def test_epochs_between_covers_partial_weeks():
+    assert epochs_between("2023-01-05", "2023-01-11") == [0]
+    assert epochs_between("2023-01-11", "2023-01-12") == [0, 1]
+    assert epoch_of(epoch_start(0) - 1) == -1
@@ -0,0 +1,40 @@
+import os
+import pytest
+from utils.helpers import Shared, atomic_path
+
+
+def test_atomic_path_replaces_the_file(tmp_path):
+    path = str(tmp_path / "state" / "file.txt")
+    with atomic_path(path) as temp:
+        with open(temp, "w") as f:
+            f.write("new")
+        assert not os.path.exists(path)
+    with open(path) as f:
+        assert f.read() == "new"
+    assert os.listdir(tmp_path / "state") == ["file.txt"]
+
+
+def test_atomic_path_keeps_the_old_file_on_error(tmp_path):
+    path = str(tmp_path / "file.txt")
+    with open(path, "w") as f:
+        f.write("old")
+    with pytest.raises(ValueError):
+        with atomic_path(path) as temp:
+            with open(temp, "w") as f:
+                f.write("half")
+            raise ValueError("write failed")
+    with open(path) as f:
+        assert f.read() == "old"
+    assert os.listdir(tmp_path) == ["file.txt"]
+
+
+def test_shared_builds_once_per_key():
+    shared = Shared()
+    builds = []
+    build = lambda: builds.append(1) or len(builds)
+    assert shared.get(build) == 1
+    assert shared.get(build) == 1
+    assert shared.get(build, "other") == 2
+    shared.set(10, "other")
+    assert shared.get(build, "other") == 10
+    assert len(builds) == 2
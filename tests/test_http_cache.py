@@ -0,0 +1,64 @@
+import pytest
+from utils.http_cache import HttpCache
+from utils.subgraph import OPEN_END, day_windows, post_days
+
+URL = "https://subgraph.example"
+DAY = 86400
+TODAY = 1700006400  # a UTC midnight
+QUERY = {"variables": {"startTime": 0, "endTime": OPEN_END}, "query": "query dayDatas($startTime: Int!, $endTime: Int!) {...}"}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [TODAY + 7 * 3600.0]
+    monkeypatch.setattr("utils.http_cache.time.time", lambda: now[0])
+    return now
+
+
+class Response:
+    def __init__(self, body):
+        self.body = body
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.body
+
+
+class Session:
+    # Serves day rows for days -3..0 (relative to TODAY), filtered like date_gt/date_lt
+    def __init__(self):
+        self.posts = []
+
+    def post(self, url, json, timeout):
+        variables = json["variables"]
+        self.posts.append((variables["startTime"], variables["endTime"]))
+        days = [TODAY + offset * DAY for offset in range(-3, 1)]
+        return Response({"data": {"dayDatas": [{"date": day} for day in days if variables["startTime"] < day < variables["endTime"]]}})
+
+
+def test_immutable_entries_outlive_the_ttl(tmp_path, clock):
+    cache = HttpCache(str(tmp_path), {URL: 60}, 1024 * 1024)
+    cache.put("POST", URL, {"q": 1}, "open")
+    cache.put("POST", URL, {"q": 2}, "closed", immutable=True)
+    clock[0] += 3600
+    assert cache.get("POST", URL, {"q": 1}) is None
+    assert cache.get("POST", URL, {"q": 2}) == "closed"
+
+
+def test_day_windows_split_at_midnight(clock):
+    assert day_windows(TODAY - 3 * DAY, 6 * 3600) == [({"startTime": TODAY - 3 * DAY, "endTime": TODAY}, True), ({"startTime": TODAY - 1, "endTime": OPEN_END}, False)]
+    # Too early in the day for the subgraph to be trusted to have indexed past midnight
+    assert day_windows(TODAY - 3 * DAY, 8 * 3600)[0][1] is False
+    assert day_windows(TODAY - 1) == [({"startTime": TODAY - 1, "endTime": OPEN_END}, False)]
+
+
+def test_post_days_refetches_only_today(tmp_path, clock):
+    cache = HttpCache(str(tmp_path), {URL: 60}, 1024 * 1024, closed_after=6 * 3600)
+    session = Session()
+    first = post_days(session, URL, QUERY, TODAY - 3 * DAY, cache=cache)
+    assert [row["date"] for row in first["dayDatas"]] == [TODAY - 2 * DAY, TODAY - DAY, TODAY]
+    clock[0] += 3600
+    assert post_days(session, URL, QUERY, TODAY - 3 * DAY, cache=cache) == first
+    assert session.posts == [(TODAY - 3 * DAY, TODAY), (TODAY - 1, OPEN_END), (TODAY - 1, OPEN_END)]
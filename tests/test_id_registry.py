@@ -0,0 +1,35 @@
+import pandas as pd
+from utils.id_registry import new_pair_rows, suffix_duplicates
+
+P1 = "0x" + "0" * 36 + "1111"
+P2 = "0x" + "0" * 36 + "2222"
+P3 = "0x" + "0" * 36 + "3333"
+P4 = "0x" + "0" * 36 + "4444"
+
+
+def test_refresh_without_new_pairs():
+    new_df = new_pair_rows({}, [P1])
+    assert new_df.empty
+    assert new_df.columns.tolist() == ["name", "address", "type"]
+    known_df = pd.DataFrame({"name": ["vAMM-X/Y"], "address": [P1], "type": ["vAMM"]})
+    ids_df = pd.concat([known_df, new_df], axis=0).set_index("address").reindex([P1]).reset_index()
+    assert suffix_duplicates(ids_df).tolist() == ["vAMM-X/Y"]
+
+
+def test_new_pairs_get_type_and_old_names():
+    new_df = new_pair_rows({P1: "vAMM-X/Y", P2: "sAMM-A/B"}, [P2])
+    assert new_df.values.tolist() == [["vAMM-X/Y", P1, "vAMM"], ["sAMM-A/B OLD", P2, "sAMM"]]
+
+
+def test_incremental_names_match_a_full_rebuild():
+    raw = pd.DataFrame({"name": ["vAMM-X/Y", "vAMM-X/Y", "sAMM-Z/W", "sAMM-Z/W"], "address": [P1, P2, P3, P4]})
+    full = suffix_duplicates(raw)
+    assert full.tolist() == ["vAMM-X/Y 1111", "vAMM-X/Y 2222", "sAMM-Z/W 3333", "sAMM-Z/W 4444"]
+    # The previous run saw P1-P3: P1 and P2 were suffixed, P3 was not; P4 is new with P3's symbol
+    incremental = pd.DataFrame({"name": ["vAMM-X/Y 1111", "vAMM-X/Y 2222", "sAMM-Z/W", "sAMM-Z/W"], "address": [P1, P2, P3, P4]})
+    assert suffix_duplicates(incremental).tolist() == full.tolist()
+
+
+def test_suffix_is_dropped_once_the_duplicate_is_gone():
+    df = pd.DataFrame({"name": ["vAMM-X/Y 1111", "sAMM-A/B"], "address": [P1, P2]})
+    assert suffix_duplicates(df).tolist() == ["vAMM-X/Y", "sAMM-A/B"]
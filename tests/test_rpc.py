@@ -0,0 +1,49 @@
+import asyncio
+from utils.rpc import AsyncRPCClient
+
+FAST = "https://fast.example"
+SLOW = "https://slow.example"
+
+
+class FakeClient(AsyncRPCClient):
+    # Answers after a fixed delay per endpoint instead of posting
+    def __init__(self, delays, **kwargs):
+        super().__init__(list(delays), **kwargs)
+        self.delays = delays
+        self.posted = []
+
+    async def post(self, url, payload):
+        self.posted.append(url)
+        await asyncio.sleep(self.delays[url])
+        return {"result": url}
+
+
+def test_hedge_delay_scales_with_batch_size():
+    client = AsyncRPCClient([FAST], hedge_after=2, hedge_calls=50)
+    assert client.hedge_delay() == 2
+    assert client.hedge_delay(50) == 2
+    assert client.hedge_delay(500) == 20
+    assert AsyncRPCClient([FAST]).hedge_delay(500) == 0
+
+
+def test_lost_race_is_a_latency_sample_not_a_success():
+    client = FakeClient({SLOW: 1.0, FAST: 0.0}, hedge_after=0.05, breaker_threshold=2)
+    slow = client.router.health[SLOW]
+    slow.consecutive_failures = 1
+    slow.error_rate = 0.5
+    result = asyncio.run(client.race("eth_call", [SLOW, FAST], {}, client.hedge_delay()))
+    assert result == FAST
+    assert client.hedges == 1
+    assert slow.inflight == 0
+    assert slow.latency is not None and slow.latency >= 0.05
+    assert slow.requests == 0
+    assert slow.consecutive_failures == 1
+    assert slow.error_rate == 0.5
+
+
+def test_large_batches_are_not_hedged_early():
+    client = FakeClient({SLOW: 0.1, FAST: 0.0}, hedge_after=0.05, hedge_calls=10)
+    result = asyncio.run(client.race("eth_call", [SLOW, FAST], {}, client.hedge_delay(100)))
+    assert result == SLOW
+    assert client.posted == [SLOW]
+    assert client.hedges == 0
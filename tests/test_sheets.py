@@ -0,0 +1,146 @@
+import pandas as pd
+import pytest
+from utils.sheets import SheetSync
+
+
+class FakeWorksheet:
+    # The cells of one sheet, changed by the batch_update requests SheetSync sends
+    def __init__(self):
+        self.id = 0
+        self.title = "Master"
+        self.cells = []
+        self._properties = {"gridProperties": {"rowCount": 1000, "columnCount": 26}}
+
+    @property
+    def row_count(self):
+        return self._properties["gridProperties"]["rowCount"]
+
+    @property
+    def col_count(self):
+        return self._properties["gridProperties"]["columnCount"]
+
+    def row_values(self, row):
+        values = list(self.cells[row - 1]) if row <= len(self.cells) else []
+        while values and values[-1] == "":
+            values.pop()
+        return values
+
+    def col_values(self, column):
+        values = [row[column - 1] if len(row) >= column else "" for row in self.cells]
+        while values and values[-1] == "":
+            values.pop()
+        return values
+
+    def set_rows(self, row_index, rows):
+        while len(self.cells) < row_index + len(rows):
+            self.cells.append([])
+        for offset, row in enumerate(rows):
+            self.cells[row_index + offset] = list(row)
+
+
+class FakeSpreadsheet:
+    def __init__(self, worksheet):
+        self.id = "sheet"
+        self.worksheet = worksheet
+        self.requests = []
+
+    def batch_update(self, body):
+        for request in body["requests"]:
+            self.requests.append(request)
+            if "deleteDimension" in request:
+                span = request["deleteDimension"]["range"]
+                del self.worksheet.cells[span["startIndex"]:span["endIndex"]]
+            elif "pasteData" in request:
+                paste = request["pasteData"]
+                rows = [line.split("\t") for line in paste["data"].split("\n")]
+                self.worksheet.set_rows(paste["coordinate"]["rowIndex"], rows)
+            elif "updateCells" in request and "start" in request["updateCells"]:
+                update = request["updateCells"]
+                rows = [[next(iter(cell["userEnteredValue"].values())) if cell else "" for cell in row["values"]] for row in update["rows"]]
+                self.worksheet.set_rows(update["start"]["rowIndex"], rows)
+            elif "updateCells" in request:
+                self.worksheet.cells = []
+
+
+@pytest.fixture
+def sheet(tmp_path):
+    worksheet = FakeWorksheet()
+    spreadsheet = FakeSpreadsheet(worksheet)
+    return spreadsheet, worksheet, str(tmp_path)
+
+
+def frame(rows):
+    return pd.DataFrame(rows, columns=["epoch", "name", "amount"])
+
+
+def cells(df):
+    return [list(df.columns)] + [[str(value) for value in row] for row in df.values.tolist()]
+
+
+def test_first_sync_writes_everything(sheet):
+    spreadsheet, worksheet, snapshots = sheet
+    df = frame([[1, "a", 1.5], [1, "b", 2.5]])
+    stats = SheetSync(spreadsheet, worksheet, snapshots).sync(df, ["epoch", "name"])
+    assert stats == {"inserts": 2, "updates": 0, "deletes": 0, "full": 1}
+    assert worksheet.cells == cells(df)
+
+
+def test_diff_writes_only_changed_rows(sheet):
+    spreadsheet, worksheet, snapshots = sheet
+    SheetSync(spreadsheet, worksheet, snapshots).sync(frame([[1, "a", 1.5], [1, "b", 2.5], [2, "a", 3.5]]), ["epoch", "name"])
+    spreadsheet.requests.clear()
+    df = frame([[1, "a", 1.5], [2, "a", 4.5], [2, "b", 5.5]])
+    stats = SheetSync(spreadsheet, worksheet, snapshots).sync(df, ["epoch", "name"])
+    assert stats == {"inserts": 1, "updates": 1, "deletes": 1, "full": 0}
+    assert not any("updateCells" in request for request in spreadsheet.requests)
+    assert worksheet.cells == cells(df)
+
+
+def test_repeated_keys_rewrite_the_sheet(sheet):
+    spreadsheet, worksheet, snapshots = sheet
+    SheetSync(spreadsheet, worksheet, snapshots).sync(frame([[1, "a", 1.5], [1, "a", 2.5], [1, "a", 3.5]]), ["epoch", "name"])
+    df = frame([[1, "a", 2.5], [1, "a", 3.5]])
+    assert SheetSync(spreadsheet, worksheet, snapshots).sync(df, ["epoch", "name"])["full"] == 1
+    assert worksheet.cells == cells(df)
+
+
+def test_insert_before_existing_rows_keeps_frame_order(sheet):
+    spreadsheet, worksheet, snapshots = sheet
+    SheetSync(spreadsheet, worksheet, snapshots).sync(frame([[1, "a", 1.5], [2, "a", 2.5]]), ["epoch", "name"])
+    df = frame([[1, "a", 1.5], [1, "b", 9.5], [2, "a", 2.5]])
+    assert SheetSync(spreadsheet, worksheet, snapshots).sync(df, ["epoch", "name"])["full"] == 1
+    assert worksheet.cells == cells(df)
+    # Appending at the end is still a diff
+    df = frame([[1, "a", 1.5], [1, "b", 9.5], [2, "a", 2.5], [3, "a", 0.5]])
+    assert SheetSync(spreadsheet, worksheet, snapshots).sync(df, ["epoch", "name"]) == {"inserts": 1, "updates": 0, "deletes": 0, "full": 0}
+    assert worksheet.cells == cells(df)
+
+
+def test_unchanged_frame_sends_nothing(sheet):
+    spreadsheet, worksheet, snapshots = sheet
+    df = frame([[1, "a", 1.5]])
+    SheetSync(spreadsheet, worksheet, snapshots).sync(df, ["epoch", "name"])
+    spreadsheet.requests.clear()
+    assert SheetSync(spreadsheet, worksheet, snapshots).sync(df, ["epoch", "name"])["full"] == 0
+    assert spreadsheet.requests == []
+
+
+@pytest.mark.parametrize("edit", [
+    lambda worksheet: worksheet.cells.pop(),
+    lambda worksheet: worksheet.cells.append(["9", "z", "0"]),
+    lambda worksheet: worksheet.cells[0].__setitem__(2, "renamed"),
+])
+def test_sheet_edited_elsewhere_is_rewritten(sheet, edit):
+    spreadsheet, worksheet, snapshots = sheet
+    SheetSync(spreadsheet, worksheet, snapshots).sync(frame([[1, "a", 1.5], [1, "b", 2.5]]), ["epoch", "name"])
+    edit(worksheet)
+    df = frame([[1, "a", 1.5], [1, "b", 3.5]])
+    assert SheetSync(spreadsheet, worksheet, snapshots).sync(df, ["epoch", "name"])["full"] == 1
+    assert worksheet.cells == cells(df)
+
+
+def test_raw_value_input_keeps_values_typed(sheet):
+    spreadsheet, worksheet, snapshots = sheet
+    SheetSync(spreadsheet, worksheet, snapshots, "RAW").sync(frame([[1, "a", 1.5], [1, "0012", float("nan")]]), ["epoch", "name"])
+    assert not any("pasteData" in request for request in spreadsheet.requests)
+    assert worksheet.cells == [["epoch", "name", "amount"], [1, "a", 1.5], [1, "0012", ""]]
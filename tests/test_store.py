@@ -0,0 +1,57 @@
+import os
+import pandas as pd
+import pytest
+from utils.store import Store
+
+DATASETS = {
+    "pair_data": {"key": "date", "partition": "month", "row_key": ["id"]},
+    "fee_data": {"key": "epoch", "partition": "epoch", "row_key": ["epoch", "name"]},
+}
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = Store(str(tmp_path), DATASETS)
+    store.write("fee_data", pd.DataFrame({"epoch": [1, 2, 2, 3, 4], "name": ["a", "a", "b", "a", "a"], "fee": [1.0, 2.0, 3.0, 4.0, 5.0]}))
+    store.write("pair_data", pd.DataFrame({"id": ["p-1", "p-2", "p-3"], "date": ["2024-01-30", "2024-02-01", "2024-02-02"], "volume": [1, 2, 3]}))
+    return store
+
+
+def partitions(store, dataset):
+    return sorted(os.listdir(os.path.join(store.path, dataset)))
+
+
+def test_write_partitions_by_key(store):
+    assert partitions(store, "fee_data") == ["00001.parquet", "00002.parquet", "00003.parquet", "00004.parquet"]
+    assert partitions(store, "pair_data") == ["2024-01.parquet", "2024-02.parquet"]
+
+
+def test_replace_range_keeps_rows_outside_the_range(store):
+    store.replace_range("fee_data", pd.DataFrame({"epoch": [2, 3], "name": ["c", "c"], "fee": [7.0, 8.0]}), 2, 3)
+    df = store.read("fee_data").sort_values(["epoch", "name"])
+    assert df[["epoch", "name"]].values.tolist() == [[1, "a"], [2, "c"], [3, "c"], [4, "a"]]
+
+
+def test_replace_range_drops_emptied_partitions(store):
+    store.replace_range("fee_data", pd.DataFrame({"epoch": [2], "name": ["c"], "fee": [7.0]}), 2, 3)
+    assert partitions(store, "fee_data") == ["00001.parquet", "00002.parquet", "00004.parquet"]
+
+
+def test_replace_without_end_replaces_the_tail(store):
+    store.replace("pair_data", pd.DataFrame({"id": ["p-4"], "date": ["2024-02-01"], "volume": [9]}), "2024-02-01")
+    df = store.read("pair_data")
+    assert df["id"].tolist() == ["p-1", "p-4"]
+    assert partitions(store, "pair_data") == ["2024-01.parquet", "2024-02.parquet"]
+
+
+def test_read_with_matches_a_read_after_replace(store):
+    df = pd.DataFrame({"id": ["p-4", "p-5"], "date": ["2024-02-01", "2024-03-01"], "volume": [9, 10]})
+    store.replace("pair_data", df, "2024-02-01")
+    assert store.read_with("pair_data", (df, "2024-02-01")).equals(store.read("pair_data"))
+    assert store.read_before("pair_data", "2024-02-01")["id"].tolist() == ["p-1"]
+
+
+def test_replace_keys_rewrites_only_those_keys(store):
+    store.replace_keys("fee_data", pd.DataFrame({"epoch": [4, 6], "name": ["b", "b"], "fee": [7.0, 8.0]}), [4, 6])
+    df = store.read("fee_data").sort_values(["epoch", "name"])
+    assert df[["epoch", "name"]].values.tolist() == [[1, "a"], [2, "a"], [2, "b"], [3, "a"], [4, "b"], [6, "b"]]
@@ -0,0 +1,56 @@
+import os
+import sys
+import subprocess
+import pytest
+import yaml
+from thena_data import ordered, run_pipeline
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FAILING = '''from application_logging.logger import logger
+from utils.stages import stage_failed
+
+try:
+    raise ValueError("boom")
+except Exception as e:
+    logger.error("Error occurred during Failing Data process. Error: %s" % e)
+    stage_failed(__file__, "Failing Data")
+'''
+
+WRITES = '''open({marker!r}, "w").close()
+'''
+
+
+def pipeline(tmp_path):
+    (tmp_path / "failing_data.py").write_text(FAILING)
+    (tmp_path / "dependent_data.py").write_text(WRITES.format(marker=str(tmp_path / "dependent.ran")))
+    (tmp_path / "other_data.py").write_text(WRITES.format(marker=str(tmp_path / "other.ran")))
+    return {
+        "failing": {"script": str(tmp_path / "failing_data.py"), "needs": []},
+        "dependent": {"script": str(tmp_path / "dependent_data.py"), "needs": ["failing"]},
+        "other": {"script": str(tmp_path / "other_data.py"), "needs": []},
+    }
+
+
+def test_failed_stage_fails_node_and_skips_dependents(tmp_path):
+    nodes = pipeline(tmp_path)
+    status = run_pipeline(nodes, list(nodes), 2)
+    assert status == {"failing": "failed", "dependent": "skipped", "other": "done"}
+    assert not (tmp_path / "dependent.ran").exists()
+    assert (tmp_path / "other.ran").exists()
+
+
+def test_failed_node_exits_non_zero(tmp_path):
+    nodes = pipeline(tmp_path)
+    (tmp_path / "params.yaml").write_text(yaml.safe_dump({"pipeline": {"max_workers": 2, "nodes": nodes}}))
+    env = {**os.environ, "PYTHONPATH": ROOT}
+    result = subprocess.run([sys.executable, os.path.join(ROOT, "thena_data.py")], cwd=tmp_path, env=env)
+    assert result.returncode == 1
+    assert not (tmp_path / "dependent.ran").exists()
+
+
+def test_undeclared_need_is_reported(tmp_path):
+    nodes = pipeline(tmp_path)
+    nodes["dependent"]["needs"] = ["failing", "id_data"]
+    with pytest.raises(ValueError, match="dependent needs id_data"):
+        ordered(nodes, ["other"])
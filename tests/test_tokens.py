@@ -0,0 +1,75 @@
+import os
+import pandas as pd
+import pytest
+from utils.helpers import read_params
+from utils.rewards import reward_amounts, reward_rows
+from utils.tokens import TokenRegistry, token_amounts
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+A = "0x" + "a" * 40
+B = "0x" + "b" * 40
+TOKEN_ABI = read_params(os.path.join(ROOT, "params.yaml"))["web3"]["token_abi"]
+
+
+@pytest.fixture
+def registry(tmp_path):
+    return TokenRegistry(str(tmp_path / "tokens.parquet"), TOKEN_ABI)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("utils.tokens.time.time", lambda: now[0])
+    return now
+
+
+def prices(*tokens):
+    return {"data": [{"name": name, "address": address, "price": price, "decimals": 18} for name, address, price in tokens]}
+
+
+def test_refresh_prices_tokens(registry, clock):
+    registry.refresh(prices(("THENA", A.upper().replace("0X", "0x"), 0.5), ("WBNB", B, 600.0)))
+    found = registry.lookup(pd.Series([A, B, "0x" + "c" * 40]))
+    assert found["price"].tolist()[:2] == [0.5, 600.0]
+    assert found["decimals"].tolist()[:2] == [18, 18]
+    assert found.iloc[2].isna().all()
+    assert registry.price_of("THENA") == 0.5
+
+
+def test_tokens_missing_from_a_later_refresh_have_no_price(registry, clock):
+    registry.refresh(prices(("THENA", A, 2.0), ("WBNB", B, 600.0)))
+    clock[0] += 600
+    registry.refresh(prices(("WBNB", B, 610.0)))
+    found = registry.lookup(pd.Series([A, B]))
+    assert pd.isna(found["price"].iloc[0])
+    assert found["decimals"].iloc[0] == 18
+    assert found["price"].iloc[1] == 610.0
+    assert pd.isna(registry.price_of("THENA"))
+
+
+def test_saved_prices_are_not_served_before_a_refresh(registry, clock):
+    registry.refresh(prices(("THENA", A, 2.0)))
+    registry.save()
+    reloaded = TokenRegistry(registry.path, TOKEN_ABI)
+    assert pd.isna(reloaded.lookup(pd.Series([A]))["price"].iloc[0])
+    assert reloaded.lookup(pd.Series([A]))["decimals"].iloc[0] == 18
+    clock[0] += 600
+    reloaded.refresh(prices(("THENA", A, 3.0)))
+    assert reloaded.price_of("THENA") == 3.0
+
+
+def test_rewards_in_stale_tokens_are_left_out(registry, clock):
+    registry.refresh(prices(("THENA", A, 2.0), ("WBNB", B, 600.0)))
+    clock[0] += 600
+    registry.refresh(prices(("WBNB", B, 600.0)))
+    rewards_df = reward_rows(["pool"], [[{"address": A, "amount": 10 ** 18}, {"address": B, "amount": 2 * 10 ** 18}]], "bribes")
+    amounts = reward_amounts(rewards_df, registry, "bribes", "bribe_amount")
+    assert amounts["bribe_amount"].tolist() == [1200.0]
+
+
+def test_token_amounts_are_exact():
+    raw = pd.Series([10 ** 30 + 1, 5, 123456789], dtype=object)
+    amounts = token_amounts(raw, pd.Series([18.0, None, 6.0]))
+    assert amounts.iloc[0] == float(10 ** 12)
+    assert pd.isna(amounts.iloc[1])
+    assert amounts.iloc[2] == 123.456789
@@ -0,0 +1,101 @@
+import sys
+import runpy
+import argparse
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Dict, List
+from application_logging.logger import logger
+from utils.helpers import read_params
+from utils.stages import clear_stages, failed_stages
+
+# Runs the dataset scripts as one DAG (params.yaml pipeline:) in a single process, so imports, params.yaml,
+# the shared input CSVs (utils.inputs), the Google Sheets client (utils.publisher) and the local store are set up
+# once per run, and nodes whose inputs are ready run in parallel.
+#   python thena_data.py                         every node
+#   python thena_data.py pair_data fee_tvl_data  only these, in dependency order; inputs that are not selected are used as they are
+
+
+def check_needs(nodes: Dict[str, Dict[str, Any]]) -> None:
+    # Every need must be a node itself, or it could never be run or waited for
+    undeclared = [f"{name} needs {need}" for name, node in nodes.items() for need in node["needs"] if need not in nodes]
+    if undeclared:
+        raise ValueError(f"Pipeline needs that are not nodes: {', '.join(undeclared)}")
+
+
+def ordered(nodes: Dict[str, Dict[str, Any]], selected: List[str]) -> List[str]:
+    # Selected nodes in dependency order
+    check_needs(nodes)
+    order: List[str] = []
+    visiting = set()
+
+    def visit(name: str) -> None:
+        if name in order:
+            return
+        if name in visiting:
+            raise ValueError(f"Pipeline has a cycle through {name}")
+        visiting.add(name)
+        for need in nodes[name]["needs"]:
+            visit(need)
+        visiting.discard(name)
+        order.append(name)
+
+    for name in selected:
+        visit(name)
+    return [name for name in order if name in selected]
+
+
+def run_node(name: str, script: str) -> None:
+    # Scripts log a failed stage and carry on, so the node fails on any stage recorded in utils.stages
+    logger.info(f"Pipeline node {name} started")
+    clear_stages(script)
+    runpy.run_path(script, run_name="__main__")
+    failed = failed_stages(script)
+    if failed:
+        raise RuntimeError(f"stages failed: {', '.join(failed)}")
+    logger.info(f"Pipeline node {name} ended")
+
+
+def run_pipeline(nodes: Dict[str, Dict[str, Any]], selected: List[str], max_workers: int) -> Dict[str, str]:
+    # Returns done/failed/skipped per node; a node is skipped when a selected input failed or was skipped
+    pending = ordered(nodes, selected)
+    status: Dict[str, str] = {}
+    running = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while pending or running:
+            for name in list(pending):
+                needs = [need for need in nodes[name]["needs"] if need in selected]
+                if any(status.get(need) in ("failed", "skipped") for need in needs):
+                    status[name] = "skipped"
+                    pending.remove(name)
+                    logger.error(f"Pipeline node {name} skipped, an input failed")
+                elif all(status.get(need) == "done" for need in needs):
+                    running[executor.submit(run_node, name, nodes[name]["script"])] = name
+                    pending.remove(name)
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    future.result()
+                    status[name] = "done"
+                except (Exception, SystemExit) as e:
+                    status[name] = "failed"
+                    logger.error(f"Pipeline node {name} failed. Error: {e}", exc_info=True)
+    return status
+
+
+if __name__ == "__main__":
+    config = read_params("params.yaml")
+    nodes = config["pipeline"]["nodes"]
+
+    parser = argparse.ArgumentParser(description="Refresh Thena datasets in one process")
+    parser.add_argument("nodes", nargs="*", help=f"nodes to run (default: all): {', '.join(nodes)}")
+    args = parser.parse_args()
+    unknown = [name for name in args.nodes if name not in nodes]
+    if unknown:
+        parser.error(f"unknown pipeline nodes: {', '.join(unknown)}")
+
+    logger.info("Pipeline Started")
+    status = run_pipeline(nodes, args.nodes or list(nodes), config["pipeline"]["max_workers"])
+    logger.info(f"Pipeline Ended: {status}")
+    sys.exit(0 if all(state == "done" for state in status.values()) else 1)
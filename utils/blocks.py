@@ -0,0 +1,41 @@
+from typing import Dict, Optional
+from utils.call_cache import CallCache
+from utils.rpc import AsyncRPCClient
+
+
+async def block_before(client: AsyncRPCClient, timestamp: int, cache: Optional[CallCache] = None) -> int:
+    # Number of the last block mined before timestamp: reads pinned to it see the state at that boundary.
+    # Interpolation search on block timestamps, falling back to bisection when a guess does not halve the range,
+    # since block times have changed over the chain's life.
+    if cache is not None:
+        number = cache.get_block(timestamp)
+        if number is not None:
+            return number
+    timestamps: Dict[int, int] = {}
+
+    async def block_time(number: int) -> int:
+        if number not in timestamps:
+            timestamps[number] = int((await client.block(number))["timestamp"], 16)
+        return timestamps[number]
+
+    latest = await client.block("latest")
+    hi, hi_time = int(latest["number"], 16), int(latest["timestamp"], 16)
+    if hi_time < timestamp:
+        raise ValueError(f"Timestamp {timestamp} is after the latest block")
+    lo, lo_time = 0, await block_time(0)
+    bisect = False
+    while hi - lo > 1:
+        if bisect:
+            guess = (lo + hi) // 2
+        else:
+            guess = lo + (timestamp - lo_time) * (hi - lo) // max(hi_time - lo_time, 1)
+        guess = min(max(guess, lo + 1), hi - 1)
+        width = hi - lo
+        if await block_time(guess) < timestamp:
+            lo, lo_time = guess, timestamps[guess]
+        else:
+            hi, hi_time = guess, timestamps[guess]
+        bisect = hi - lo > width // 2
+    if cache is not None:
+        cache.put_block(timestamp, lo)
+    return lo
@@ -0,0 +1,71 @@
+import os
+import time
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from utils.epochs import WEEK
+
+
+def epoch_closed(timestamp: int) -> bool:
+    # An epoch starting at timestamp is over, so reads keyed by it (rewardData, _totalSupply) are final
+    return timestamp + WEEK <= time.time()
+
+
+class CallCache:
+    # Return data of eth_calls that can no longer change, in SQLite, keyed by chain, target, calldata and scope.
+    # The scope is the block number for calls pinned to a block, or "final" for latest-block calls whose
+    # arguments name a closed epoch. Only successful calls are stored.
+    def __init__(self, path: str, chain_id: int):
+        self.path = path
+        self.chain_id = chain_id
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS calls (chain INTEGER, target TEXT, calldata TEXT, scope TEXT, result BLOB, "
+            "PRIMARY KEY (chain, target, calldata, scope)) WITHOUT ROWID"
+        )
+        self.connection.execute("CREATE TABLE IF NOT EXISTS blocks (chain INTEGER, timestamp INTEGER, number INTEGER, PRIMARY KEY (chain, timestamp))")
+        self.connection.commit()
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "CallCache":
+        return cls(config["call_cache"]["path"], config["web3"]["chain_id"])
+
+    def get_many(self, calls: Sequence[Tuple[str, str]], scope: Any) -> List[Optional[bytes]]:
+        # calls are (target, calldata) pairs; returns the cached return data or None for each
+        with self.lock:
+            found = {}
+            for start in range(0, len(calls), 500):
+                chunk = calls[start:start + 500]
+                rows = self.connection.execute(
+                    "SELECT target, calldata, result FROM calls WHERE chain = ? AND scope = ? AND (target, calldata) IN (VALUES %s)"
+                    % ", ".join(["(?, ?)"] * len(chunk)),
+                    [self.chain_id, str(scope)] + [value for target, calldata in chunk for value in (target.lower(), calldata)],
+                ).fetchall()
+                found.update({(target, calldata): result for target, calldata, result in rows})
+        return [found.get((target.lower(), calldata)) for target, calldata in calls]
+
+    def put_many(self, results: Sequence[Tuple[str, str, bytes]], scope: Any) -> None:
+        with self.lock:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO calls VALUES (?, ?, ?, ?, ?)",
+                [(self.chain_id, target.lower(), calldata, str(scope), result) for target, calldata, result in results],
+            )
+            self.connection.commit()
+
+    def get_block(self, timestamp: int) -> Optional[int]:
+        # Last block mined before timestamp, as found by utils.blocks.block_before
+        with self.lock:
+            row = self.connection.execute("SELECT number FROM blocks WHERE chain = ? AND timestamp = ?", (self.chain_id, timestamp)).fetchone()
+        return row[0] if row else None
+
+    def put_block(self, timestamp: int, number: int) -> None:
+        with self.lock:
+            self.connection.execute("INSERT OR REPLACE INTO blocks VALUES (?, ?, ?)", (self.chain_id, timestamp, number))
+            self.connection.commit()
+
+    def close(self) -> None:
+        with self.lock:
+            self.connection.close()
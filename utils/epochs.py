@@ -0,0 +1,54 @@
+import time
+from datetime import date, datetime, timezone
+from typing import List, Optional, Union
+import numpy as np
+
+# Thena epochs are fixed 7-day windows (Thursday 00:00 UTC to the next Thursday) counted from epoch 0,
+# so the calendar is integer arithmetic on unix timestamps and needs no epoch.csv lookups.
+GENESIS = 1672876800  # start of epoch 0, 2023-01-05 00:00 UTC
+DAY = 86400
+WEEK = 7 * DAY
+
+
+def now() -> int:
+    return int(time.time())
+
+
+def epoch_of(timestamp: int) -> int:
+    # Epoch containing timestamp; negative before epoch 0
+    return (int(timestamp) - GENESIS) // WEEK
+
+
+def epoch_start(epoch: int) -> int:
+    return GENESIS + int(epoch) * WEEK
+
+
+def epoch_end(epoch: int) -> int:
+    # Start of the next epoch (exclusive end)
+    return epoch_start(epoch + 1)
+
+
+def current_epoch(timestamp: Optional[int] = None) -> int:
+    return epoch_of(now() if timestamp is None else timestamp)
+
+
+def day_timestamp(day: Union[date, datetime, str]) -> int:
+    # Midnight UTC of a date, datetime or YYYY-MM-DD string
+    if isinstance(day, str):
+        day = datetime.strptime(day, "%Y-%m-%d")
+    return int(datetime(day.year, day.month, day.day, tzinfo=timezone.utc).timestamp())
+
+
+def epochs_between(start: Union[date, datetime, str], end: Union[date, datetime, str]) -> List[int]:
+    # Epochs overlapping the days start..end, inclusive
+    return list(range(epoch_of(day_timestamp(start)), epoch_of(day_timestamp(end)) + 1))
+
+
+def epochs_of(timestamps: np.ndarray) -> np.ndarray:
+    # Vectorized epoch_of
+    return (np.asarray(timestamps, dtype=np.int64) - GENESIS) // WEEK
+
+
+def epoch_starts(epochs: np.ndarray) -> np.ndarray:
+    # Vectorized epoch_start
+    return GENESIS + np.asarray(epochs, dtype=np.int64) * WEEK
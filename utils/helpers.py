@@ -1,7 +1,48 @@
+import os
+import copy
+import threading
 import yaml
-from typing import Any, Dict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Generic, Iterator, TypeVar
+
+T = TypeVar("T")
+
+_configs: Dict[str, Dict[str, Any]] = {}
 
 def read_params(config_path: str) -> Dict[str, Any]:
-    with open(config_path) as yaml_file:
-        config = yaml.safe_load(yaml_file)
-    return config
\ No newline at end of file
+    # Parsed once per process (thena_data.py runs every script in one), each caller gets its own copy
+    path = os.path.abspath(config_path)
+    if path not in _configs:
+        with open(config_path) as yaml_file:
+            _configs[path] = yaml.safe_load(yaml_file)
+    return copy.deepcopy(_configs[path])
+
+@contextmanager
+def atomic_path(path: str) -> Iterator[str]:
+    # Yields a temporary file name next to path; once the block has written it, it replaces path in one
+    # step, so other threads and processes never read a half-written file. On error path is left untouched
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    temp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        yield temp
+        os.replace(temp, path)
+    finally:
+        if os.path.exists(temp):
+            os.remove(temp)
+
+
+class Shared(Generic[T]):
+    # Values built on first use and then shared by every stage of the process, one per key
+    def __init__(self):
+        self.values: Dict[Any, T] = {}
+        self.lock = threading.Lock()
+
+    def get(self, build: Callable[[], T], key: Any = None) -> T:
+        with self.lock:
+            if key not in self.values:
+                self.values[key] = build()
+            return self.values[key]
+
+    def set(self, value: T, key: Any = None) -> None:
+        with self.lock:
+            self.values[key] = value
@@ -0,0 +1,131 @@
+import os
+import json
+import time
+import glob
+import hashlib
+import threading
+from typing import Any, Dict, Optional
+import requests
+from application_logging.logger import logger
+from utils.helpers import Shared, atomic_path
+
+# Persistent response cache, one JSON file per request under http_cache.path:
+#   <sha256 of method, url and body>.json  ->  {"url", "expires", "data"}
+# Entries live for the TTL of their endpoint (params.yaml http_cache.ttl, keyed by the api:/query: names);
+# answers for closed days never change and are stored without expiry (see utils.subgraph.post_days).
+# A file's mtime is its last use, and the least recently used files are evicted once the cache grows past max_mb.
+
+
+def day_start(now: Optional[float] = None) -> int:
+    now = time.time() if now is None else now
+    return int(now) - int(now) % 86400
+
+
+def closed(end_timestamp: float, after: float = 0) -> bool:
+    # True when a query window ended at least after seconds ago, so the subgraph has indexed past it
+    # and its answer can no longer change
+    return time.time() >= end_timestamp + after
+
+
+class HttpCache:
+    def __init__(self, path: str, ttl: Dict[str, float], max_bytes: int, closed_after: float = 0):
+        self.path = path
+        self.ttl = ttl  # url prefix -> seconds
+        self.max_bytes = max_bytes
+        self.closed_after = closed_after  # seconds after a day ends before answers about it are kept for good
+        self.size: Optional[int] = None
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "HttpCache":
+        settings = config["http_cache"]
+        urls = {**config["api"], **{name: url for name, url in config["query"].items() if isinstance(url, str)}}
+        # Keys are substituted into some URLs at run time, so match on the part before the placeholder
+        ttl = {urls[name].split("[api-key]")[0]: seconds for name, seconds in settings["ttl"].items()}
+        return cls(settings["path"], ttl, settings["max_mb"] * 1024 * 1024, settings["closed_after"])
+
+    def ttl_for(self, url: str) -> float:
+        matches = [prefix for prefix in self.ttl if url.startswith(prefix)]
+        return self.ttl[max(matches, key=len)] if matches else 0
+
+    def file(self, method: str, url: str, body: Any = None) -> str:
+        key = json.dumps([method, url, body], sort_keys=True)
+        return os.path.join(self.path, hashlib.sha256(key.encode()).hexdigest() + ".json")
+
+    def get(self, method: str, url: str, body: Any = None) -> Optional[Any]:
+        path = self.file(method, url, body)
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        if entry["expires"] is not None and entry["expires"] < time.time():
+            self.remove(path)
+            self.misses += 1
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.hits += 1
+        return entry["data"]
+
+    def put(self, method: str, url: str, body: Any, data: Any, immutable: bool = False) -> None:
+        ttl = self.ttl_for(url)
+        if not immutable and ttl <= 0:
+            return
+        entry = {"url": url, "expires": None if immutable else time.time() + ttl, "data": data}
+        with atomic_path(self.file(method, url, body)) as temp:
+            with open(temp, "w") as f:
+                json.dump(entry, f)
+            written = os.path.getsize(temp)
+        with self.lock:
+            if self.size is None:
+                self.size = sum(os.path.getsize(f) for f in glob.glob(os.path.join(self.path, "*.json")))
+            else:
+                self.size += written
+            if self.size > self.max_bytes:
+                self.evict()
+
+    def remove(self, path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def evict(self) -> None:
+        # Drop least recently used files until the cache is back under 90% of its bound
+        files = []
+        for path in glob.glob(os.path.join(self.path, "*.json")):
+            try:
+                files.append((os.path.getmtime(path), os.path.getsize(path), path))
+            except OSError:
+                continue
+        files.sort()
+        self.size = sum(size for _, size, _ in files)
+        for _, size, path in files:
+            if self.size <= self.max_bytes * 0.9:
+                break
+            self.remove(path)
+            self.size -= size
+        logger.info(f"HTTP cache evicted down to {self.size} bytes")
+
+    def get_json(self, url: str, session: Any = requests, timeout: float = 15, immutable: bool = False) -> Any:
+        data = self.get("GET", url)
+        if data is None:
+            response = session.get(url, timeout=timeout)
+            response.raise_for_status()
+            data = response.json()
+            self.put("GET", url, None, data, immutable)
+        return data
+
+
+_cache: Shared[HttpCache] = Shared()
+
+
+def get_cache(config: Dict[str, Any]) -> HttpCache:
+    # One instance per process, so all stages share the size accounting
+    return _cache.get(lambda: HttpCache.from_config(config))
@@ -0,0 +1,54 @@
+from typing import Any, Dict, List, Sequence, Set
+import pandas as pd
+from application_logging.logger import logger
+
+ZERO_ADDRESS = "0x0000000000000000000000000000000000000000"
+
+
+def load_registry(path: str, columns: Sequence[str]) -> pd.DataFrame:
+    # The ID table written by the previous run is the registry; if it cannot be read everything is rediscovered
+    try:
+        return pd.read_csv(path)[list(columns)]
+    except Exception as e:
+        logger.error(f"Could not read ID registry {path}, rebuilding from scratch: {e}")
+        return pd.DataFrame(columns=list(columns))
+
+
+def unseen(registry: pd.DataFrame, addresses: Sequence[str], key: str = "address") -> List[str]:
+    known = set(registry[key].str.lower())
+    return [address for address in addresses if address.lower() not in known]
+
+
+def possibly_killed(registry: pd.DataFrame, fusion_data: List[Dict[str, Any]]) -> Set[str]:
+    # Pools whose gauge in the registry no longer matches the gauge reported by the Thena API
+    api_df = pd.json_normalize(fusion_data)
+    if "gauge.address" not in api_df.columns:
+        api_df["gauge.address"] = ZERO_ADDRESS
+    api_df = api_df[["address", "gauge.address"]].fillna(ZERO_ADDRESS)
+    api_df["address"] = api_df["address"].str.lower()
+    api_df["gauge.address"] = api_df["gauge.address"].str.lower()
+
+    registry_df = registry[["address", "gauges"]].copy()
+    registry_df["lower"] = registry_df["address"].str.lower()
+    registry_df["gauges"] = registry_df["gauges"].fillna(ZERO_ADDRESS).str.lower()
+    merged = registry_df.merge(api_df, how="inner", left_on="lower", right_on="address", suffixes=("", "_api"))
+    return set(merged.loc[merged["gauges"] != merged["gauge.address"], "address"])
+
+
+def new_pair_rows(symbols: Dict[str, str], old_pools: Sequence[str]) -> pd.DataFrame:
+    # Name, address and type (symbol prefix, e.g. vAMM) of newly discovered pairs, superseded pairs (pool_lists
+    # old) named "<symbol> OLD". Empty, with the same columns, on the usual incremental run that finds none
+    df = pd.DataFrame([{"name": symbol, "address": address} for address, symbol in symbols.items()], columns=["name", "address"])
+    df["type"] = df["name"].str.split("-", n=1).str[0]
+    old = df["address"].isin(old_pools)
+    df.loc[old, "name"] = df.loc[old, "name"] + " OLD"
+    return df
+
+
+def suffix_duplicates(df: pd.DataFrame) -> pd.Series:
+    # Pairs sharing a name are told apart by the last 4 characters of their address. Registry names may carry
+    # that suffix already, so it is stripped and reapplied over known and new pairs together, as a full rebuild does
+    suffixes = " " + df["address"].str[-4:]
+    names = pd.Series([name[:-len(suffix)] if isinstance(name, str) and name.endswith(suffix) else name for name, suffix in zip(df["name"], suffixes)], index=df.index, dtype=object)
+    duplicated = names.duplicated(keep=False) & names.notna()
+    return names.where(~duplicated, names + suffixes)
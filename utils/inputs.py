@@ -0,0 +1,29 @@
+import threading
+from typing import Any, Dict
+import pandas as pd
+
+# Shared input tables (params.yaml files:), kept in memory for the life of the process. Each one is
+# downloaded once however many stages read it, and a stage that produces one (the ID scripts) shares
+# its fresh frame so later stages in the same run see it instead of the last pushed CSV.
+_frames: Dict[str, pd.DataFrame] = {}
+_locks: Dict[str, threading.Lock] = {}
+_locks_lock = threading.Lock()
+
+
+def _lock(name: str) -> threading.Lock:
+    with _locks_lock:
+        return _locks.setdefault(name, threading.Lock())
+
+
+def read_input(config: Dict[str, Any], name: str) -> pd.DataFrame:
+    # Callers get their own copy and are free to modify it
+    with _lock(name):
+        if name not in _frames:
+            _frames[name] = pd.read_csv(config["files"][name])
+        return _frames[name].copy()
+
+
+def share_input(name: str, path: str) -> None:
+    # Re-read from the local file just written, so readers get exactly what the pushed CSV will parse to
+    with _lock(name):
+        _frames[name] = pd.read_csv(path)
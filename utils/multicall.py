@@ -0,0 +1,129 @@
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+from eth_abi import decode_abi
+from web3 import Web3
+from web3.contract import Contract
+from web3._utils.abi import get_abi_output_types, map_abi_data
+from web3._utils.normalizers import BASE_RETURN_NORMALIZERS
+from utils.call_cache import CallCache
+from utils.rpc import AsyncRPCClient, RPCError
+
+ZERO_ADDRESS = "0x0000000000000000000000000000000000000000"
+
+
+class Call(NamedTuple):
+    target: str
+    contract: Contract  # address-less contract, only used for the ABI
+    fn_name: str
+    args: Tuple[Any, ...] = ()
+
+
+def abi_contract(abi: str) -> Contract:
+    return Web3().eth.contract(abi=abi)
+
+
+def is_live(address: Any) -> bool:
+    return isinstance(address, str) and address != ZERO_ADDRESS
+
+
+def chunks(items: Sequence[Any], size: int):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def encode_call(call: Call) -> Tuple[str, bool, str]:
+    return (call.target, True, call.contract.encodeABI(fn_name=call.fn_name, args=list(call.args)))
+
+
+def decode_result(call: Call, success: bool, return_data: bytes) -> Optional[Any]:
+    # Failed or reverted sub-calls come back as None instead of aborting the batch
+    if not success or not return_data:
+        return None
+    fn_abi = call.contract.get_function_by_name(call.fn_name).abi
+    output_types = get_abi_output_types(fn_abi)
+    try:
+        decoded = decode_abi(output_types, return_data)
+    except Exception:
+        return None
+    normalized = map_abi_data(BASE_RETURN_NORMALIZERS, output_types, decoded)
+    return normalized[0] if len(normalized) == 1 else tuple(normalized)
+
+
+class Multicall:
+    def __init__(self, client: AsyncRPCClient, address: str, abi: str, batch_size: int = 500, cache: Optional[CallCache] = None):
+        self.client = client
+        self.address = address
+        self.contract = abi_contract(abi)
+        self.batch_size = batch_size
+        self.cache = cache
+        self.requests = 0
+        self.cached = 0
+
+    async def aggregate(self, calls: Sequence[Call], block: Any = "latest", require_success: bool = False, final: bool = False) -> List[Optional[Any]]:
+        # Calls pinned to a block number, or marked final (their arguments name a closed epoch), are answered
+        # from the call cache when possible; only the misses go on chain.
+        encoded = [encode_call(call) for call in calls]
+        scope = block if isinstance(block, int) else "final"
+        cacheable = self.cache is not None and (final or isinstance(block, int))
+        cached = self.cache.get_many([(target, data) for target, _, data in encoded], scope) if cacheable else [None] * len(calls)
+        missing = [i for i, hit in enumerate(cached) if hit is None]
+        self.cached += len(calls) - len(missing)
+
+        # Batches of one wave are independent, so they are sent concurrently
+        batches = list(chunks(missing, self.batch_size))
+        payloads = [
+            (self.address, self.contract.encodeABI(fn_name="aggregate3", args=[[encoded[i] for i in batch]]))
+            for batch in batches
+        ]
+        returned = await self.client.gather_eth_call(payloads, block, [len(batch) for batch in batches])
+        self.requests += len(payloads)
+
+        results = [decode_result(call, True, hit) if hit is not None else None for call, hit in zip(calls, cached)]
+        fresh = []
+        for batch, data in zip(batches, returned):
+            (batch_results,) = decode_abi(["(bool,bytes)[]"], data)
+            for i, (success, return_data) in zip(batch, batch_results):
+                results[i] = decode_result(calls[i], success, return_data)
+                if results[i] is not None:
+                    fresh.append((encoded[i][0], encoded[i][2], return_data))
+        if cacheable and fresh:
+            self.cache.put_many(fresh, scope)
+
+        failed = [call for call, result in zip(calls, results) if result is None]
+        if require_success and failed:
+            raise RPCError(f"{len(failed)} of {len(calls)} calls failed, first: {failed[0].fn_name} on {failed[0].target}")
+        return results
+
+
+async def read_rewards(multicall: Multicall, bribe_contract: Contract, addresses: Sequence[str], timestamp: int, final: bool = False, block: Any = "latest") -> List[List[Dict[str, Any]]]:
+    # Returns one list of {"address", "amount"} per input address, in input order.
+    # final: the epoch at timestamp is closed, so its rewardData can come from the call cache.
+    # block: read every wave at this block number instead of the latest state (backfills).
+    live = [i for i, address in enumerate(addresses) if is_live(address)]
+
+    # Wave 1: rewardsListLength() of every contract
+    lengths = await multicall.aggregate([Call(addresses[i], bribe_contract, "rewardsListLength") for i in live], block)
+
+    # Wave 2: rewardTokens(i) for every index of every contract
+    token_calls = []
+    owners = []
+    for i, length in zip(live, lengths):
+        for reward_num in range(length or 0):
+            token_calls.append(Call(addresses[i], bribe_contract, "rewardTokens", (reward_num,)))
+            owners.append(i)
+    tokens = await multicall.aggregate(token_calls, block)
+
+    # Wave 3: rewardData(token, timestamp) for every token
+    data_calls = []
+    data_owners = []
+    for i, token in zip(owners, tokens):
+        if token is None:
+            continue
+        data_calls.append(Call(addresses[i], bribe_contract, "rewardData", (token, timestamp)))
+        data_owners.append(i)
+    reward_data = await multicall.aggregate(data_calls, block, final=final)
+
+    rewards = [[] for _ in addresses]
+    for i, call, data in zip(data_owners, data_calls, reward_data):
+        if data is not None and data[1] > 0:
+            rewards[i].append({"address": call.args[0], "amount": data[1]})
+    return rewards
@@ -0,0 +1,220 @@
+import os
+import time
+import pickle
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+import pandas as pd
+import requests
+from application_logging.logger import logger
+from utils.helpers import Shared, atomic_path, read_params
+from utils.inputs import read_input
+
+# Columns of the ID tables (params.yaml files: id_data, new_id_data), one Pool field each
+POOL_FIELDS = ("name", "address", "type", "gauges", "bribe_ca", "fee_ca", "algebra_pool", "algebra_name", "new_name", "alm_type")
+# Lookup indexes: index name -> field. Keys are lowercase addresses (or the type), values pools in table order
+INDEXES = {"address": "address", "algebra_pool": "algebra_pool", "gauge": "gauges", "bribe_ca": "bribe_ca", "fee_ca": "fee_ca", "type": "type"}
+
+
+class Pool:
+    __slots__ = POOL_FIELDS + ("position",)
+
+    def __init__(self, position: int, **fields: Any):
+        self.position = position
+        for field in POOL_FIELDS:
+            setattr(self, field, fields.get(field))
+
+    def replace(self, **changes: Any) -> "Pool":
+        return Pool(self.position, **{**{field: getattr(self, field) for field in POOL_FIELDS}, **changes})
+
+    def __repr__(self) -> str:
+        return f"Pool({self.name!r}, {self.address!r}, {self.type!r})"
+
+
+def index_key(value: Any) -> Optional[str]:
+    return value.lower() if isinstance(value, str) else None
+
+
+class PoolRegistry:
+    # An ID table as Pool records with prebuilt indexes, so stages look pools up by address, algebra pool,
+    # gauge, bribe, fee contract or type in constant time instead of filtering and merging the frame.
+    def __init__(self, pools: Sequence[Pool], columns: Sequence[str], source: Optional[str] = None):
+        self.pools = list(pools)
+        self.columns = list(columns)
+        self.source = source  # ETag of the CSV the records were read from, None when unknown
+        self.indexes: Dict[str, Dict[str, List[Pool]]] = {name: {} for name in INDEXES}
+        for pool in self.pools:
+            for name, field in INDEXES.items():
+                value = getattr(pool, field)
+                key = (value if isinstance(value, str) else None) if name == "type" else index_key(value)
+                if key is not None:
+                    self.indexes[name].setdefault(key, []).append(pool)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, source: Optional[str] = None) -> "PoolRegistry":
+        columns = [column for column in POOL_FIELDS if column in df.columns]
+        pools = [Pool(position, **dict(zip(columns, row))) for position, row in enumerate(df[columns].itertuples(index=False, name=None))]
+        return cls(pools, columns, source)
+
+    def __len__(self) -> int:
+        return len(self.pools)
+
+    def __iter__(self):
+        return iter(self.pools)
+
+    def find(self, index: str, key: Any) -> List[Pool]:
+        return self.indexes[index].get(key if index == "type" else index_key(key), [])
+
+    def get(self, index: str, key: Any) -> Optional[Pool]:
+        # First pool in table order, as drop_duplicates(keep="first") would give
+        found = self.find(index, key)
+        return found[0] if found else None
+
+    def __contains__(self, address: Any) -> bool:
+        return index_key(address) in self.indexes["address"]
+
+    def of_type(self, *types: str) -> List[Pool]:
+        return sorted((pool for pool_type in types for pool in self.indexes["type"].get(pool_type, [])), key=lambda pool: pool.position)
+
+    def other_than(self, *types: str) -> List[Pool]:
+        return self.of_type(*(pool_type for pool_type in self.indexes["type"] if pool_type not in types))
+
+    def mapping(self, index: str, field: str) -> Dict[str, Any]:
+        # Lowercase key -> field of the first pool under it, for Series.map on lowercased addresses
+        return {key: getattr(pools[0], field) for key, pools in self.indexes[index].items()}
+
+    def fusion_pools(self) -> List[Pool]:
+        # One record per algebra pool (last name in descending order wins ties, as in the fusion stages),
+        # with the contract suffix trimmed from Gamma/ICHI style names ("aOKSE-WBNB B4B4" -> "OKSE-WBNB")
+        pools = {}
+        for pool in sorted(self.of_type("CL"), key=lambda pool: pool.name, reverse=True):
+            pools.setdefault(index_key(pool.algebra_pool), pool)
+        return [pool.replace(name=pool.name[:-5]) if pool.name.startswith("a") else pool for pool in pools.values()]
+
+    def frame(self, pools: Optional[Iterable[Pool]] = None, columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        columns = list(columns or self.columns)
+        pools = self.pools if pools is None else list(pools)
+        return pd.DataFrame([[getattr(pool, column) for column in columns] for pool in pools], columns=columns)
+
+    def save(self, path: str) -> None:
+        rows = [tuple(getattr(pool, column) for column in self.columns) for pool in self.pools]
+        with atomic_path(path) as temp:
+            with open(temp, "wb") as f:
+                pickle.dump({"source": self.source, "columns": self.columns, "rows": rows}, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, path: str) -> "PoolRegistry":
+        with open(path, "rb") as f:
+            snapshot = pickle.load(f)
+        pools = [Pool(position, **dict(zip(snapshot["columns"], row))) for position, row in enumerate(snapshot["rows"])]
+        return cls(pools, snapshot["columns"], snapshot["source"])
+
+
+def source_tag(url: str) -> Optional[str]:
+    # ETag of the published CSV; a snapshot is reused only while it matches
+    try:
+        response = requests.head(url, timeout=10, allow_redirects=True)
+        response.raise_for_status()
+        return response.headers.get("ETag")
+    except Exception as e:
+        logger.info(f"Could not check {url}: {e}")
+        return None
+
+
+_registries: Shared[PoolRegistry] = Shared()
+
+
+def snapshot_path(config: Dict[str, Any], name: str) -> str:
+    return os.path.join(config["pools"]["path"], f"{name}.pickle")
+
+
+def load_pools(config: Dict[str, Any], name: str) -> PoolRegistry:
+    # From the binary snapshot when the published CSV has not changed since the snapshot was written, else from the CSV
+    path = snapshot_path(config, name)
+    tag = source_tag(config["files"][name])
+    registry = None
+    if tag is not None and os.path.exists(path):
+        try:
+            registry = PoolRegistry.load(path)
+        except Exception as e:
+            logger.info(f"Pool snapshot {path} not readable: {e}")
+        if registry is not None and registry.source != tag:
+            registry = None
+    if registry is None:
+        registry = PoolRegistry.from_frame(read_input(config, name), tag)
+        if tag is not None:
+            registry.save(path)
+    return registry
+
+
+def get_pools(config: Dict[str, Any], name: str) -> PoolRegistry:
+    # One registry per ID table and process, shared by every stage
+    return _registries.get(lambda: load_pools(config, name), name)
+
+
+def share_pools(config: Dict[str, Any], name: str) -> None:
+    # After an ID script shares a fresh table (utils.inputs.share_input), later stages in the run see it too.
+    # No snapshot is written: the next process checks the pushed CSV and rebuilds it from there.
+    _registries.set(PoolRegistry.from_frame(read_input(config, name)), name)
+
+
+def pool_lists(config: Dict[str, Any]) -> Dict[str, List[str]]:
+    # Hand-maintained pool lists (params.yaml pools: lists): skip, old
+    return read_params(config["pools"]["lists"])
+
+
+def skipped_pools(config: Dict[str, Any]) -> Set[str]:
+    return {address.lower() for address in pool_lists(config)["skip"]}
+
+
+class PoolStatus:
+    # Consecutive empty answers per pool (lowercase address) for one stage, kept between runs; callers record
+    # successful responses only, so an outage never marks a pool dead. Used by the subgraph day-data stages,
+    # where a window without day rows means no activity; event-window queries (TVL mints/burns) are not gated,
+    # since a quiet pool is still alive, and neither are the RPC reads.
+    # After dead_after misses in a row a pool is only requested again once probe_after seconds have passed
+    # since its last request; any data resets it. probe_after should stay a few hours below the interval between
+    # runs, or scheduler jitter pushes a probe to the run after, and below the stage's delta window, so a pool
+    # that comes back is picked up before any of its days fall out of the window.
+    def __init__(self, path: str, dead_after: int, probe_after: float):
+        self.path = path
+        self.dead_after = dead_after
+        self.probe_after = probe_after
+        self.lock = threading.Lock()
+        self.status = self.load()  # address -> (misses, last requested)
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any], stage: str) -> "PoolStatus":
+        settings = config["pools"]["status"]
+        return cls(os.path.join(settings["path"], f"{stage}.parquet"), settings["dead_after"], settings["probe_after"])
+
+    def load(self) -> Dict[str, Tuple[int, float]]:
+        try:
+            df = pd.read_parquet(self.path)
+        except Exception as e:
+            logger.info(f"No pool status at {self.path}, requesting every pool: {e}")
+            return {}
+        return {address: (int(misses), float(requested)) for address, misses, requested in zip(df["address"], df["misses"], df["requested"])}
+
+    def due(self, addresses: Sequence[Any]) -> List[bool]:
+        # One flag per address: False for dead pools that are not up for a probe yet
+        now = time.time()
+        with self.lock:
+            flags = []
+            for address in addresses:
+                misses, requested = self.status.get(str(address).lower(), (0, 0.0))
+                flags.append(misses < self.dead_after or now - requested >= self.probe_after)
+        if not all(flags):
+            logger.info(f"Pool status {os.path.basename(self.path)}: skipping {flags.count(False)} of {len(flags)} dead pools")
+        return flags
+
+    def record(self, address: Any, found: bool) -> None:
+        key = str(address).lower()
+        with self.lock:
+            misses, _ = self.status.get(key, (0, 0.0))
+            self.status[key] = (0 if found else misses + 1, time.time())
+
+    def save(self) -> None:
+        with self.lock:
+            df = pd.DataFrame([(address, misses, requested) for address, (misses, requested) in self.status.items()], columns=["address", "misses", "requested"])
+        with atomic_path(self.path) as temp:
+            df.to_parquet(temp, index=False)
@@ -0,0 +1,74 @@
+import os
+import json
+import time
+import threading
+from typing import Any, Dict, Optional, Tuple
+import gspread
+from gspread import Client, Spreadsheet, Worksheet
+from application_logging.logger import logger
+from utils.helpers import Shared
+from utils.sheets import sync_dataset
+from utils.store import Store
+
+
+class Publisher:
+    # One authenticated gspread client per process. The service account token is exchanged once, the client's
+    # AuthorizedSession keeps its connections alive, and spreadsheet/worksheet metadata is fetched once per key.
+    def __init__(self, credentials: Optional[Dict[str, Any]] = None, retries: int = 3, delay: float = 30):
+        self.credentials = credentials
+        self.retries = retries
+        self.delay = delay
+        self._client: Optional[Client] = None
+        self.spreadsheets: Dict[str, Spreadsheet] = {}
+        self.worksheets: Dict[Tuple[str, str], Worksheet] = {}
+        self.lock = threading.RLock()
+
+    @property
+    def client(self) -> Client:
+        with self.lock:
+            if self._client is None:
+                credentials = self.credentials or json.loads(os.environ["GKEY"])
+                self._client = gspread.service_account_from_dict(credentials)
+            return self._client
+
+    def spreadsheet(self, key: str) -> Spreadsheet:
+        with self.lock:
+            if key not in self.spreadsheets:
+                self.spreadsheets[key] = self.client.open_by_key(key)
+            return self.spreadsheets[key]
+
+    def worksheet(self, key: str, name: str = "Master") -> Worksheet:
+        with self.lock:
+            if (key, name) not in self.worksheets:
+                self.worksheets[(key, name)] = self.spreadsheet(key).worksheet(name)
+            return self.worksheets[(key, name)]
+
+    def forget(self, key: str) -> None:
+        # After a failed write the cached handles may be stale (sheet resized or renamed elsewhere), reopen them on retry
+        with self.lock:
+            self.spreadsheets.pop(key, None)
+            for cached in [cached for cached in self.worksheets if cached[0] == key]:
+                del self.worksheets[cached]
+
+    def publish(self, store: Store, dataset: str, key: str, worksheet_name: str = "Master") -> Dict[str, int]:
+        # Sync a store dataset to its sheet, retrying the whole sync; returns the row counts that were written
+        for attempt in range(self.retries):
+            try:
+                return sync_dataset(self.spreadsheet(key), self.worksheet(key, worksheet_name), store, dataset)
+            except Exception as e:
+                logger.error(f"Error occurred: {e}")
+                self.forget(key)
+                if attempt < self.retries - 1:
+                    logger.error(f"Retrying in {self.delay} seconds... (Attempt {attempt + 2}/{self.retries})")
+                    time.sleep(self.delay)
+                else:
+                    logger.error("All retries failed.")
+                    raise
+
+
+_publisher: Shared[Publisher] = Shared()
+
+
+def get_publisher() -> Publisher:
+    # Shared by every script and stage running in this process; authentication happens on first use
+    return _publisher.get(Publisher)
@@ -0,0 +1,48 @@
+from typing import List, Sequence, Tuple
+import pandas as pd
+from application_logging.logger import logger
+from utils.helpers import atomic_path
+
+# Incremental revenue. The revenue rows of an epoch depend only on that epoch's pair fees, bribes and
+# emissions, the previous epoch's bribes (bribe_amount_offset) and the ID table, so a fingerprint of those
+# inputs is kept per epoch and only epochs whose fingerprint changed are recomputed and rewritten.
+
+
+def epoch_hashes(df: pd.DataFrame, shift: int = 0) -> pd.Series:
+    # epoch -> order-independent hash of its rows; rows of epoch e count towards e + shift
+    hashes = pd.util.hash_pandas_object(df, index=False)
+    return hashes.groupby(df["epoch"].to_numpy() + shift).sum()
+
+
+def epoch_fingerprints(inputs: Sequence[Tuple[pd.DataFrame, int]], ids_df: pd.DataFrame) -> pd.Series:
+    # inputs are (frame, shift) pairs as for epoch_hashes; a change to the ID table changes every epoch
+    parts = pd.concat([epoch_hashes(df, shift) for df, shift in inputs], axis=1).fillna(0).astype("uint64")
+    parts["ids"] = pd.util.hash_pandas_object(ids_df, index=False).sum()
+    return pd.util.hash_pandas_object(parts, index=True)
+
+
+class EpochState:
+    # Fingerprints of the inputs each materialized epoch was computed from, one Parquet file per dataset
+    def __init__(self, path: str):
+        self.path = path
+
+    def load(self) -> pd.Series:
+        try:
+            return pd.read_parquet(self.path).set_index("epoch")["fingerprint"]
+        except Exception as e:
+            logger.info(f"No epoch state at {self.path}, recomputing every epoch: {e}")
+            return pd.Series(dtype="uint64")
+
+    def diff(self, fingerprints: pd.Series) -> Tuple[List[int], List[int], bool]:
+        # (epochs to recompute, epochs to remove, full rebuild)
+        previous = self.load()
+        if previous.empty:
+            return list(fingerprints.index), [], True
+        same = fingerprints.index.isin(previous.index) & (previous.reindex(fingerprints.index, fill_value=0).to_numpy() == fingerprints.to_numpy())
+        changed = list(fingerprints.index[~same])
+        removed = list(previous.index.difference(fingerprints.index))
+        return changed, removed, False
+
+    def save(self, fingerprints: pd.Series) -> None:
+        with atomic_path(self.path) as temp:
+            fingerprints.rename_axis("epoch").rename("fingerprint").reset_index().to_parquet(temp, index=False)
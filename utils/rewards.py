@@ -0,0 +1,58 @@
+from typing import Any, Dict, List, Sequence
+import pandas as pd
+from application_logging.logger import logger
+from utils.multicall import is_live
+from utils.tokens import TokenRegistry, token_amounts
+
+# Turning raw contract reads into dataset rows, shared by the bribe, fee and emissions scripts and backfill.py
+
+
+def reward_rows(names: Sequence[str], rewards: Sequence[List[Dict[str, Any]]], raw_column: str) -> pd.DataFrame:
+    # One row per (pool name, reward token) from read_rewards output
+    rows = []
+    for name, contract_rewards in zip(names, rewards):
+        for reward in contract_rewards:
+            rows.append({"name": name, raw_column: reward["amount"], "address": reward["address"]})
+    return pd.DataFrame(rows, columns=["name", raw_column, "address"])
+
+
+def reward_amounts(rewards_df: pd.DataFrame, tokens: TokenRegistry, raw_column: str, amount_column: str) -> pd.DataFrame:
+    # USD value of the rewards per pool name, at the last known price of each token
+    rewards_df = rewards_df.copy()
+    found = tokens.lookup(rewards_df["address"])
+    unpriced = found["price"].isna()
+    if unpriced.any():
+        logger.info(f"No price for {unpriced.sum()} reward tokens: {', '.join(rewards_df.loc[unpriced, 'address'].str.lower().unique())}")
+    # Scale to token units before pricing, so 18-decimal amounts are not rounded as raw integers first
+    rewards_df[amount_column] = found["price"] * token_amounts(rewards_df[raw_column], found["decimals"])
+    return rewards_df.groupby(by="name")[amount_column].sum().reset_index()
+
+
+def emissions_frame(ids_df: pd.DataFrame, gauge_rewards: Dict[str, Any], bribe_supplies: Dict[str, Any], THE_price: float, epoch: int) -> pd.DataFrame:
+    # Weekly gauge emissions and vote weight per pool, valued at THE_price
+    ids_df = ids_df.copy()
+    ids_df["epoch"] = epoch
+
+    weeklyreward = []
+    for gauge in ids_df["gauges"]:
+        reward = gauge_rewards.get(gauge)
+        if is_live(gauge) and reward is None:
+            logger.error(f"Error occurred while fetching emissions for {gauge}")
+        weeklyreward.append((reward or 0) / 1000000000000000000)
+
+    ids_df["emissions"] = weeklyreward
+
+    voteweight = []
+    for bribe in ids_df["bribe_ca"]:
+        supply = bribe_supplies.get(bribe)
+        if is_live(bribe) and supply is None:
+            logger.error(f"Error occurred while fetching voteweight for {bribe}")
+        voteweight.append((supply or 0) / 1000000000000000000)
+
+    ids_df["voteweight"] = voteweight
+
+    # Cleanup
+    ids_df["THE_price"] = THE_price
+    ids_df["value"] = ids_df["emissions"] * ids_df["THE_price"]
+    ids_df = ids_df[["epoch", "name", "voteweight", "emissions", "value", "THE_price"]]
+    return ids_df[ids_df["voteweight"] > 0]
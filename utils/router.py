@@ -0,0 +1,88 @@
+import time
+from typing import Any, Dict, List, Optional, Sequence
+from application_logging.logger import logger
+
+
+class EndpointHealth:
+    __slots__ = ("url", "order", "latency", "error_rate", "requests", "failures", "consecutive_failures", "open_until", "inflight")
+
+    def __init__(self, url: str, order: int):
+        self.url = url
+        self.order = order
+        self.latency: Optional[float] = None  # EWMA in seconds, None until first sample
+        self.error_rate = 0.0  # EWMA of failures
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.open_until = 0.0  # circuit breaker, open while monotonic time < open_until
+        self.inflight = 0
+
+
+class EndpointRouter:
+    def __init__(self, provider_urls: Sequence[str], alpha: float = 0.2, breaker_threshold: int = 3, breaker_cooldown: float = 60.0, default_latency: float = 1.0):
+        self.health = {url: EndpointHealth(url, order) for order, url in enumerate(provider_urls)}
+        self.alpha = alpha
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown
+        self.default_latency = default_latency
+
+    def score(self, health: EndpointHealth) -> float:
+        # Lower is better: expected latency, inflated by recent errors and current load
+        latency = self.default_latency if health.latency is None else health.latency
+        return latency * (1 + 4 * health.error_rate) * (1 + health.inflight)
+
+    def ranked(self) -> List[str]:
+        # Healthy endpoints fastest first, endpoints with an open breaker last as a last resort
+        now = time.monotonic()
+        closed = [h for h in self.health.values() if h.open_until <= now]
+        tripped = [h for h in self.health.values() if h.open_until > now]
+        closed.sort(key=lambda h: (self.score(h), h.order))
+        tripped.sort(key=lambda h: h.open_until)
+        return [h.url for h in closed + tripped]
+
+    def started(self, url: str) -> None:
+        self.health[url].inflight += 1
+
+    def sample(self, health: EndpointHealth, latency: float) -> None:
+        health.latency = latency if health.latency is None else (1 - self.alpha) * health.latency + self.alpha * latency
+
+    def record(self, url: str, latency: float, ok: bool) -> None:
+        health = self.health[url]
+        health.inflight -= 1
+        health.requests += 1
+        self.sample(health, latency)
+        health.error_rate = (1 - self.alpha) * health.error_rate + self.alpha * (0.0 if ok else 1.0)
+        if ok:
+            health.consecutive_failures = 0
+            health.open_until = 0.0
+            return
+        health.failures += 1
+        health.consecutive_failures += 1
+        if health.consecutive_failures >= self.breaker_threshold:
+            health.open_until = time.monotonic() + self.breaker_cooldown
+
+    def abandoned(self, url: str, latency: float) -> None:
+        # A request cancelled after losing a hedge race: the time it had taken is a latency sample (a lower bound),
+        # but it neither succeeded nor failed, so the error rate and the breaker are left as they were
+        health = self.health[url]
+        health.inflight -= 1
+        self.sample(health, latency)
+
+    def stats(self) -> List[Dict[str, Any]]:
+        now = time.monotonic()
+        ranked = self.ranked()
+        return [
+            {
+                "url": h.url,
+                "state": "open" if h.open_until > now else "closed",
+                "requests": h.requests,
+                "failures": h.failures,
+                "error_rate": round(h.error_rate, 3),
+                "latency_ms": None if h.latency is None else round(h.latency * 1000, 1),
+            }
+            for h in sorted(self.health.values(), key=lambda h: ranked.index(h.url))
+        ]
+
+    def log_stats(self) -> None:
+        for row in self.stats():
+            logger.info(f"RPC endpoint stats: {row}")
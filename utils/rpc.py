@@ -0,0 +1,127 @@
+import asyncio
+import itertools
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import aiohttp
+from application_logging.logger import logger
+from utils.router import EndpointRouter
+
+
+class RPCError(Exception):
+    pass
+
+
+class AsyncRPCClient:
+    # One pooled keep-alive session per provider URL, with a cap on in-flight requests per endpoint.
+    # Each request goes to the best endpoint according to the router (see race for hedging).
+    # hedge_after is the hedging delay of a plain request; one carrying a multicall batch of n calls waits
+    # hedge_after * n / hedge_calls instead, so large batches are not duplicated just for being large.
+    def __init__(self, provider_urls: Sequence[str], max_in_flight: int = 8, timeout: int = 30, hedge_after: float = 0, hedge_calls: int = 50, breaker_threshold: int = 3, breaker_cooldown: float = 60):
+        self.provider_urls = list(provider_urls)
+        self.max_in_flight = max_in_flight
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.hedge_after = hedge_after
+        self.hedge_calls = hedge_calls
+        self.router = EndpointRouter(self.provider_urls, breaker_threshold=breaker_threshold, breaker_cooldown=breaker_cooldown)
+        self.sessions: Dict[str, aiohttp.ClientSession] = {}
+        self.semaphores: Dict[str, asyncio.Semaphore] = {}
+        self.ids = itertools.count(1)
+        self.hedges = 0
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "AsyncRPCClient":
+        web3_config = config["web3"]
+        return cls(
+            web3_config["provider_urls"],
+            max_in_flight=web3_config["rpc_max_in_flight"],
+            timeout=web3_config["rpc_timeout"],
+            hedge_after=web3_config["rpc_hedge_after"],
+            hedge_calls=web3_config["rpc_hedge_calls"],
+            breaker_threshold=web3_config["rpc_breaker_threshold"],
+            breaker_cooldown=web3_config["rpc_breaker_cooldown"],
+        )
+
+    async def __aenter__(self) -> "AsyncRPCClient":
+        for url in self.provider_urls:
+            connector = aiohttp.TCPConnector(limit=self.max_in_flight, keepalive_timeout=60)
+            self.sessions[url] = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+            self.semaphores[url] = asyncio.Semaphore(self.max_in_flight)
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self.router.log_stats()
+        logger.info(f"RPC hedged requests: {self.hedges}")
+        await asyncio.gather(*(session.close() for session in self.sessions.values()))
+
+    async def post(self, url: str, payload: Any) -> Any:
+        async with self.semaphores[url]:
+            async with self.sessions[url].post(url, json=payload) as response:
+                response.raise_for_status()
+                return await response.json(content_type=None)
+
+    async def send(self, url: str, payload: Dict[str, Any]) -> Any:
+        self.router.started(url)
+        start = time.monotonic()
+        try:
+            body = await self.post(url, payload)
+            if "error" in body:
+                raise RPCError(body["error"])
+        except asyncio.CancelledError:
+            # Lost a hedge race: count the time spent so slow endpoints drift down the ranking
+            self.router.abandoned(url, time.monotonic() - start)
+            raise
+        except Exception:
+            self.router.record(url, time.monotonic() - start, ok=False)
+            raise
+        self.router.record(url, time.monotonic() - start, ok=True)
+        return body["result"]
+
+    def hedge_delay(self, weight: int = 1) -> float:
+        # Seconds before a request carrying weight calls is hedged, 0 when hedging is off
+        return self.hedge_after * max(1.0, weight / self.hedge_calls)
+
+    async def race(self, method: str, urls: Sequence[str], payload: Dict[str, Any], hedge_after: float = 0) -> Any:
+        # Try endpoints in ranked order. A failure moves on to the next endpoint immediately,
+        # and a request still running after hedge_after seconds is raced against the next one.
+        queue = list(urls)
+        pending: Dict[asyncio.Future, str] = {}
+        errors = []
+        launch = True
+        while True:
+            if launch and queue:
+                url = queue.pop(0)
+                pending[asyncio.ensure_future(self.send(url, payload))] = url
+            if not pending:
+                raise RPCError(f"All endpoints failed for {method}: {errors}")
+            timeout = hedge_after if hedge_after and queue else None
+            done, _ = await asyncio.wait(set(pending), timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                self.hedges += 1
+                launch = True
+                continue
+            for task in done:
+                url = pending.pop(task)
+                if task.exception() is None:
+                    for task_left in pending:
+                        task_left.cancel()
+                    return task.result()
+                errors.append(f"{url}: {task.exception()!r}")
+                logger.error(f"Error occurred while calling {method} on {url}: {task.exception()!r}")
+            launch = not pending
+
+    async def request(self, method: str, params: List[Any], weight: int = 1) -> Any:
+        payload = {"jsonrpc": "2.0", "id": next(self.ids), "method": method, "params": params}
+        return await self.race(method, self.router.ranked(), payload, self.hedge_delay(weight))
+
+    async def eth_call(self, to: str, data: str, block: Any = "latest", weight: int = 1) -> bytes:
+        # block is a tag ("latest") or a block number, for reads pinned to a past state; weight is the number
+        # of calls the request carries (a multicall batch), which scales its hedging delay
+        result = await self.request("eth_call", [{"to": to, "data": data}, hex(block) if isinstance(block, int) else block], weight)
+        return bytes.fromhex(result[2:])
+
+    async def block(self, block: Any = "latest") -> Dict[str, Any]:
+        return await self.request("eth_getBlockByNumber", [hex(block) if isinstance(block, int) else block, False])
+
+    async def gather_eth_call(self, calls: Sequence[Tuple[str, str]], block: Any = "latest", weights: Optional[Sequence[int]] = None) -> List[bytes]:
+        weights = weights or [1] * len(calls)
+        return list(await asyncio.gather(*(self.eth_call(to, data, block, weight) for (to, data), weight in zip(calls, weights))))
@@ -0,0 +1,186 @@
+import os
+import json
+import math
+import numbers
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from gspread import Spreadsheet, Worksheet
+from application_logging.logger import logger
+from utils.store import Store
+
+# Rows written per batch_update when a sheet is rewritten in full (first sync, changed columns or a sheet edited elsewhere)
+FULL_SYNC_ROWS = 20000
+
+
+def key_text(column: pd.Series) -> pd.Series:
+    # 120 and 120.0 are the same epoch whichever dtype the column was read with
+    if pd.api.types.is_float_dtype(column) and (column.dropna() % 1 == 0).all():
+        column = column.astype("Int64")
+    return column.astype(str)
+
+
+def row_keys(df: pd.DataFrame, key_columns: Sequence[str]) -> pd.Series:
+    # Key columns joined; only a frame whose keys are unique can be diffed against the snapshot
+    keys = key_text(df[key_columns[0]])
+    for column in key_columns[1:]:
+        keys = keys + "|" + key_text(df[column])
+    return keys
+
+
+def row_hashes(df: pd.DataFrame) -> pd.Series:
+    return pd.util.hash_pandas_object(df.astype(str), index=False).astype("int64")
+
+
+def cell_text(value: Any) -> str:
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return ""
+    return str(value).replace("\t", " ").replace("\n", " ")
+
+
+def raw_cell(value: Any) -> Dict[str, Any]:
+    # A cell as valueInputOption RAW stores it: numbers and booleans typed, anything else as text
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return {}
+    if isinstance(value, (bool, np.bool_)):
+        return {"userEnteredValue": {"boolValue": bool(value)}}
+    if isinstance(value, numbers.Number):
+        return {"userEnteredValue": {"numberValue": int(value) if isinstance(value, numbers.Integral) else float(value)}}
+    return {"userEnteredValue": {"stringValue": str(value)}}
+
+
+def runs(positions: Sequence[int]) -> List[Tuple[int, int]]:
+    # Sorted positions -> (start, end) ranges of consecutive positions, end exclusive
+    ranges = []
+    for position in positions:
+        if ranges and ranges[-1][1] == position:
+            ranges[-1][1] = position + 1
+        else:
+            ranges.append([position, position + 1])
+    return [(start, end) for start, end in ranges]
+
+
+def record_grid(worksheet: Worksheet, rows: int, columns: int) -> None:
+    # Keep a cached worksheet handle's grid size current after a batch_update, as Worksheet.resize does
+    grid = worksheet._properties.setdefault("gridProperties", {})
+    grid["rowCount"] = rows
+    grid["columnCount"] = max(columns, worksheet.col_count)
+
+
+class SheetSync:
+    # Keeps one worksheet equal to a frame by writing only the rows that changed since the last sync.
+    # A local snapshot (row key and hash of every data row, in sheet order) stands in for the sheet; only the
+    # header and the first key column are read back, to catch edits made outside the sync. Row 1 holds the header.
+    # The sheet is rewritten in full instead when row keys repeat or a diff would leave rows out of frame order.
+    # value_input is the valueInputOption the rows are written with, USER_ENTERED or RAW.
+    def __init__(self, spreadsheet: Spreadsheet, worksheet: Worksheet, snapshot_dir: str, value_input: str = "USER_ENTERED"):
+        self.spreadsheet = spreadsheet
+        self.worksheet = worksheet
+        self.value_input = value_input
+        self.snapshot_path = os.path.join(snapshot_dir, f"{spreadsheet.id}.{worksheet.title}.parquet")
+
+    def load_snapshot(self) -> Tuple[Optional[pd.DataFrame], Optional[List[str]]]:
+        if not os.path.exists(self.snapshot_path):
+            return None, None
+        table = pq.read_table(self.snapshot_path)
+        return table.to_pandas(), json.loads(table.schema.metadata[b"columns"])
+
+    def save_snapshot(self, snapshot: pd.DataFrame, columns: List[str]) -> None:
+        os.makedirs(os.path.dirname(self.snapshot_path), exist_ok=True)
+        table = pa.Table.from_pandas(snapshot.reset_index(drop=True), preserve_index=False)
+        table = table.replace_schema_metadata({b"columns": json.dumps(columns).encode()})
+        pq.write_table(table, self.snapshot_path)
+
+    def matches_sheet(self, snapshot: pd.DataFrame, columns: List[str], key_column: str) -> bool:
+        # The snapshot is only trusted while the sheet still has its header and as many data rows
+        header = self.worksheet.row_values(1)
+        rows = len(self.worksheet.col_values(columns.index(key_column) + 1)) - 1
+        if header != columns or rows != len(snapshot):
+            logger.info(f"Sheet {self.worksheet.title} changed outside the sync ({rows} rows, {len(snapshot)} in the snapshot), rewriting it")
+            return False
+        return True
+
+    def write_rows(self, worksheet: Worksheet, row_index: int, rows: List[List[Any]]) -> Dict[str, Any]:
+        if self.value_input == "RAW":
+            cells = [{"values": [raw_cell(value) for value in row]} for row in rows]
+            return {"updateCells": {"start": {"sheetId": worksheet.id, "rowIndex": row_index, "columnIndex": 0}, "rows": cells, "fields": "userEnteredValue"}}
+        # pasteData parses cells like typed input, as valueInputOption USER_ENTERED does
+        data = "\n".join("\t".join(cell_text(value) for value in row) for row in rows)
+        return {"pasteData": {"coordinate": {"sheetId": worksheet.id, "rowIndex": row_index, "columnIndex": 0}, "data": data, "type": "PASTE_NORMAL", "delimiter": "\t"}}
+
+    def resize(self, worksheet: Worksheet, rows_now: int, rows: int, columns: int) -> List[Dict[str, Any]]:
+        requests = []
+        if rows > rows_now:
+            requests.append({"appendDimension": {"sheetId": worksheet.id, "dimension": "ROWS", "length": rows - rows_now}})
+        if columns > worksheet.col_count:
+            requests.append({"appendDimension": {"sheetId": worksheet.id, "dimension": "COLUMNS", "length": columns - worksheet.col_count}})
+        return requests
+
+    def full_sync(self, worksheet: Worksheet, df: pd.DataFrame, keys: pd.Series, hashes: pd.Series) -> Dict[str, int]:
+        values = df.values.tolist()
+        requests = [{"updateCells": {"range": {"sheetId": worksheet.id}, "fields": "userEnteredValue"}}]
+        requests += self.resize(worksheet, worksheet.row_count, len(values) + 1, len(df.columns))
+        requests.append(self.write_rows(worksheet, 0, [list(df.columns)] + values[:FULL_SYNC_ROWS]))
+        self.spreadsheet.batch_update({"requests": requests})
+        for start in range(FULL_SYNC_ROWS, len(values), FULL_SYNC_ROWS):
+            self.spreadsheet.batch_update({"requests": [self.write_rows(worksheet, start + 1, values[start:start + FULL_SYNC_ROWS])]})
+        record_grid(worksheet, max(worksheet.row_count, len(values) + 1), len(df.columns))
+        self.save_snapshot(pd.DataFrame({"key": keys, "hash": hashes}), list(df.columns))
+        return {"inserts": len(values), "updates": 0, "deletes": 0, "full": 1}
+
+    def sync(self, df: pd.DataFrame, key_columns: Sequence[str]) -> Dict[str, int]:
+        df = df.reset_index(drop=True)
+        worksheet = self.worksheet
+        keys = row_keys(df, key_columns)
+        hashes = row_hashes(df)
+        snapshot, columns = self.load_snapshot()
+        if snapshot is None or columns != list(df.columns) or not self.matches_sheet(snapshot, columns, key_columns[0]):
+            return self.full_sync(worksheet, df, keys, hashes)
+        if keys.duplicated().any():
+            logger.info(f"Sheet {self.worksheet.title} has {int(keys.duplicated().sum())} repeated row keys, rewriting it")
+            return self.full_sync(worksheet, df, keys, hashes)
+
+        deleted = ~snapshot["key"].isin(keys)
+        if len(snapshot) and deleted.all():
+            # Nothing in common (or a snapshot keyed another way): a plain rewrite is the cheaper diff
+            return self.full_sync(worksheet, df, keys, hashes)
+
+        requests = []
+        # Deletes, bottom up so earlier row numbers stay valid
+        for start, end in reversed(runs(snapshot.index[deleted].tolist())):
+            requests.append({"deleteDimension": {"range": {"sheetId": worksheet.id, "dimension": "ROWS", "startIndex": start + 1, "endIndex": end + 1}}})
+
+        # Updates of surviving rows whose content changed
+        survivors = snapshot[~deleted].reset_index(drop=True)
+        current = pd.DataFrame({"key": keys, "hash": hashes, "row": df.index})
+        survivors = survivors.merge(current, on="key", how="left", suffixes=("_old", ""))
+        changed = survivors.index[survivors["hash_old"] != survivors["hash"]].tolist()
+        values = df.values.tolist()
+        for start, end in runs(changed):
+            requests.append(self.write_rows(worksheet, start + 1, [values[row] for row in survivors["row"][start:end]]))
+
+        # Inserts go after the surviving rows, which only keeps the frame order if that is where the frame has them
+        inserted = current[~current["key"].isin(snapshot["key"])]
+        if survivors["row"].tolist() + inserted["row"].tolist() != df.index.tolist():
+            logger.info(f"Sheet {self.worksheet.title} rows moved or were inserted before existing ones, rewriting it")
+            return self.full_sync(worksheet, df, keys, hashes)
+        total = len(survivors) + len(inserted)
+        rows_now = worksheet.row_count - int(deleted.sum())
+        requests += self.resize(worksheet, rows_now, total + 1, len(df.columns))
+        if len(inserted):
+            requests.append(self.write_rows(worksheet, len(survivors) + 1, [values[row] for row in inserted["row"]]))
+
+        stats = {"inserts": len(inserted), "updates": len(changed), "deletes": int(deleted.sum()), "full": 0}
+        if requests:
+            self.spreadsheet.batch_update({"requests": requests})
+            record_grid(worksheet, max(rows_now, total + 1), len(df.columns))
+        self.save_snapshot(pd.concat([survivors[["key", "hash"]], inserted[["key", "hash"]]], ignore_index=True), list(df.columns))
+        return stats
+
+
+def sync_dataset(spreadsheet: Spreadsheet, worksheet: Worksheet, store: Store, dataset: str) -> Dict[str, int]:
+    # Publish a store dataset to its sheet, keyed by the dataset's row_key and written with its value_input in params.yaml
+    sync = SheetSync(spreadsheet, worksheet, os.path.join(store.path, "_sheets"), store.value_input(dataset))
+    return sync.sync(store.read(dataset), store.row_key(dataset))
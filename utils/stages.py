@@ -0,0 +1,28 @@
+import os
+import threading
+from typing import Dict, List
+
+# Failed stages per dataset script. The scripts log a failed stage and carry on with the next one, so
+# thena_data.py reads the failures from here to mark the node failed and skip the nodes that need it.
+_failed: Dict[str, List[str]] = {}
+_lock = threading.Lock()
+
+
+def _script(path: str) -> str:
+    return os.path.basename(path)
+
+
+def stage_failed(script: str, stage: str) -> None:
+    # Called from a script's except block with its __file__
+    with _lock:
+        _failed.setdefault(_script(script), []).append(stage)
+
+
+def failed_stages(script: str) -> List[str]:
+    with _lock:
+        return list(_failed.get(_script(script), []))
+
+
+def clear_stages(script: str) -> None:
+    with _lock:
+        _failed.pop(_script(script), None)
@@ -0,0 +1,160 @@
+import os
+import glob
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import pandas as pd
+from application_logging.logger import logger
+
+# Local partitioned Parquet history, one directory per dataset and one file per partition:
+#   data/store/<dataset>/<partition>.parquet
+# Partitions are months of a date/timestamp key, epochs, or a single "all" file. Google Sheets is only
+# a publish target; the sheet export CSV in params.yaml files: is read once to seed an empty dataset.
+
+
+def typed(df: pd.DataFrame) -> pd.DataFrame:
+    # Subgraph numbers arrive as strings; store them as numbers so every partition has the same schema
+    df = df.copy()
+    for column in df.columns[df.dtypes == object]:
+        df[column] = pd.to_numeric(df[column], errors="ignore")
+        if df[column].dtype == object:
+            df[column] = df[column].where(df[column].isna(), df[column].astype(str))
+    return df
+
+
+class Store:
+    def __init__(self, path: str, datasets: Dict[str, Dict[str, Any]], sources: Optional[Dict[str, str]] = None):
+        self.path = path
+        self.datasets = datasets
+        self.sources = sources or {}
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "Store":
+        return cls(config["store"]["path"], config["store"]["datasets"], config["files"])
+
+    def key(self, dataset: str) -> Optional[str]:
+        return (self.datasets[dataset] or {}).get("key")
+
+    def row_key(self, dataset: str) -> List[str]:
+        # Columns identifying a row when the dataset is published (see utils.sheets)
+        return self.datasets[dataset]["row_key"]
+
+    def value_input(self, dataset: str) -> str:
+        # valueInputOption the dataset is published with (see utils.sheets)
+        return (self.datasets[dataset] or {}).get("value_input", "USER_ENTERED")
+
+    def labels(self, dataset: str, keys: pd.Series) -> pd.Series:
+        partition = (self.datasets[dataset] or {}).get("partition")
+        if partition == "month":
+            if pd.api.types.is_numeric_dtype(keys):
+                return pd.to_datetime(keys, unit="s").dt.strftime("%Y-%m")
+            return keys.astype(str).str[:7]
+        if partition == "epoch":
+            return keys.astype(int).map("{:05d}".format)
+        return pd.Series("all", index=keys.index)
+
+    def label(self, dataset: str, key: Any) -> str:
+        return self.labels(dataset, pd.Series([key]))[0]
+
+    def files(self, dataset: str, start: Any = None, end: Any = None) -> List[str]:
+        # Partition files in label order, from the one holding start to the one holding end
+        files = sorted(glob.glob(os.path.join(self.path, dataset, "*.parquet")))
+        if start is not None:
+            start_label = self.label(dataset, start)
+            files = [f for f in files if os.path.basename(f)[:-len(".parquet")] >= start_label]
+        if end is not None:
+            end_label = self.label(dataset, end)
+            files = [f for f in files if os.path.basename(f)[:-len(".parquet")] <= end_label]
+        return files
+
+    def exists(self, dataset: str) -> bool:
+        return os.path.isdir(os.path.join(self.path, dataset))
+
+    def seed(self, dataset: str) -> None:
+        source = self.sources[dataset]
+        logger.info(f"Seeding store dataset {dataset} from {source}")
+        df = pd.read_csv(source, **(self.datasets[dataset] or {}).get("csv", {}))
+        self.write(dataset, df)
+
+    def read(self, dataset: str, columns: Optional[Sequence[str]] = None, start: Any = None) -> pd.DataFrame:
+        # Rows in stored order; start skips whole partitions before the one holding that key
+        if not self.exists(dataset):
+            self.seed(dataset)
+        frames = [pd.read_parquet(f, columns=list(columns) if columns else None) for f in self.files(dataset, start)]
+        if not frames:
+            return pd.DataFrame(columns=list(columns) if columns else None)
+        return pd.concat(frames, ignore_index=True)
+
+    def read_before(self, dataset: str, end: Any, columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        # Rows whose key is < end, reading only the partitions up to the one holding end. Together with the
+        # frame a stage just passed to replace(dataset, df, end) this is the whole dataset, without re-reading df
+        if not self.exists(dataset):
+            self.seed(dataset)
+        frames = [pd.read_parquet(f, columns=list(columns) if columns else None) for f in self.files(dataset, end=end)]
+        if not frames:
+            return pd.DataFrame(columns=list(columns) if columns else None)
+        df = pd.concat(frames, ignore_index=True)
+        return df[df[self.key(dataset)] < end].reset_index(drop=True)
+
+    def read_with(self, dataset: str, replaced: Optional[Tuple[pd.DataFrame, Any]], columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        # The whole dataset, given replaced = (df, start) from the replace() a stage just made; the rows >= start
+        # come from df in memory. None (the stage failed) reads everything from disk
+        if replaced is None:
+            return self.read(dataset, columns)
+        df, start = replaced
+        df = typed(df[list(columns)] if columns else df)
+        return pd.concat([self.read_before(dataset, start, columns), df], ignore_index=True)
+
+    def write_partitions(self, dataset: str, df: pd.DataFrame, labels: Sequence[str]) -> None:
+        directory = os.path.join(self.path, dataset)
+        os.makedirs(directory, exist_ok=True)
+        key = self.key(dataset)
+        partition_labels = self.labels(dataset, df[key]) if key else pd.Series("all", index=df.index)
+        for label in labels:
+            path = os.path.join(directory, f"{label}.parquet")
+            part = df[partition_labels == label]
+            if part.empty:
+                if os.path.exists(path):
+                    os.remove(path)
+                continue
+            part.reset_index(drop=True).to_parquet(path, index=False)
+
+    def write(self, dataset: str, df: pd.DataFrame) -> None:
+        # Replace the whole dataset
+        df = typed(df)
+        for path in self.files(dataset):
+            os.remove(path)
+        key = self.key(dataset)
+        labels = self.labels(dataset, df[key]).unique() if key and not df.empty else ["all"]
+        self.write_partitions(dataset, df, labels)
+
+    def replace(self, dataset: str, df: pd.DataFrame, start: Any) -> None:
+        # Replace every row whose key is >= start with df (whose keys are all >= start); earlier partitions are untouched
+        self.replace_range(dataset, df, start)
+
+    def replace_range(self, dataset: str, df: pd.DataFrame, start: Any, end: Any = None) -> None:
+        # Replace the rows whose key is in [start, end] (no upper bound when end is None) with df
+        if not self.exists(dataset):
+            self.seed(dataset)
+        key = self.key(dataset)
+        old = self.read(dataset, start=start)
+        if not old.empty:
+            replaced = old[key] >= start if end is None else old[key].between(start, end)
+            old = old[~replaced]
+        merged = typed(pd.concat([old, df], ignore_index=True))
+        labels = set(os.path.basename(f)[:-len(".parquet")] for f in self.files(dataset, start))
+        if not merged.empty:
+            labels |= set(self.labels(dataset, merged[key]))
+        self.write_partitions(dataset, merged, sorted(labels))
+
+    def replace_keys(self, dataset: str, df: pd.DataFrame, keys: Sequence[Any]) -> None:
+        # Replace the rows whose key is one of keys with df, rewriting only the partitions that hold them
+        if not self.exists(dataset):
+            self.seed(dataset)
+        key = self.key(dataset)
+        labels = set(self.labels(dataset, pd.Series(list(keys), dtype=object)))
+        if not df.empty:
+            labels |= set(self.labels(dataset, df[key]))
+        paths = [os.path.join(self.path, dataset, f"{label}.parquet") for label in labels]
+        frames = [pd.read_parquet(path) for path in paths if os.path.exists(path)]
+        old = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=df.columns)
+        merged = typed(pd.concat([old[~old[key].isin(keys)], df], ignore_index=True))
+        self.write_partitions(dataset, merged, sorted(labels))
@@ -0,0 +1,169 @@
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+from utils.http_cache import HttpCache, closed, day_start
+
+# date_lt bound of the open (today onwards) part of a day query, the last 32-bit timestamp
+OPEN_END = 2 ** 31 - 1
+
+
+class SubgraphError(Exception):
+    pass
+
+
+class Records:
+    # Collects raw subgraph rows, each tagged with constant columns, and builds a single frame at the end,
+    # so accumulating stays linear in rows instead of copying a growing frame on every page
+    def __init__(self) -> None:
+        self.rows: List[Dict[str, Any]] = []
+
+    def extend(self, rows: Iterable[Dict[str, Any]], columns: Optional[Dict[str, Any]] = None) -> None:
+        if columns:
+            self.rows.extend({**row, **columns} for row in rows)
+        else:
+            self.rows.extend(rows)
+
+    def frame(self, columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        df = pd.json_normalize(self.rows)
+        return df if columns is None else df.reindex(columns=list(columns))
+
+
+def make_session(pool_size: int) -> requests.Session:
+    # Keep-alive connections shared by all worker threads
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def with_variables(query: Dict[str, Any], **variables: Any) -> Dict[str, Any]:
+    # Copy of a params.yaml query with some variables replaced, safe to use from several threads
+    return {**query, "variables": {**query["variables"], **variables}}
+
+
+def aliased_query(query: Dict[str, Any], key_variable: str, keys: Sequence[Any], **variables: Any) -> Dict[str, Any]:
+    # Repeats the single top-level selection of a params.yaml query once per key, aliased k0..kN,
+    # each with its own copy of the key variable, so many pairs are read in one request
+    header, _, body = query["query"].partition("{")
+    selection = body[:body.rindex("}")].strip()
+    operation, _, declared = header.partition("(")
+    declarations = [d.strip() for d in declared[:declared.rindex(")")].split(",")]
+    key_declaration = next(d for d in declarations if d.startswith(f"${key_variable}:"))
+    key_type = key_declaration.split(":", 1)[1].strip()
+    declarations.remove(key_declaration)
+    declarations += [f"${key_variable}_{i}: {key_type}" for i in range(len(keys))]
+    selections = [f"k{i}: " + re.sub(rf"\${key_variable}\b", f"${key_variable}_{i}", selection) for i in range(len(keys))]
+
+    query_variables = {name: value for name, value in query["variables"].items() if name != key_variable}
+    query_variables.update(variables)
+    query_variables.update({f"{key_variable}_{i}": key for i, key in enumerate(keys)})
+    text = "%s(%s) {\n  %s\n}" % (operation.rstrip(), ", ".join(declarations), "\n  ".join(selections))
+    return {**query, "variables": query_variables, "query": text}
+
+
+def unalias(data: Dict[str, Any], count: int) -> List[Any]:
+    return [data[f"k{i}"] for i in range(count)]
+
+
+def post_query(session: requests.Session, url: str, query: Dict[str, Any], timeout: float = 5, cache: Optional[HttpCache] = None, immutable: bool = False) -> Dict[str, Any]:
+    # With a cache, answers are reused for the endpoint's TTL, or for good when immutable (the query covers closed days only)
+    if cache is not None:
+        data = cache.get("POST", url, query)
+        if data is not None:
+            return data
+    response = session.post(url, json=query, timeout=timeout)
+    response.raise_for_status()
+    body = response.json()
+    if body.get("errors") or body.get("data") is None:
+        raise SubgraphError(body.get("errors", body))
+    if cache is not None:
+        cache.put("POST", url, query, body["data"], immutable)
+    return body["data"]
+
+
+def day_windows(start: int, closed_after: float = 0) -> List[Tuple[Dict[str, int], bool]]:
+    # The days after start split into the days before today and today onwards, as (startTime/endTime variables,
+    # immutable). The first part is immutable once the subgraph has had closed_after seconds to index past midnight
+    today = day_start()
+    if start >= today - 1:
+        return [({"startTime": start, "endTime": OPEN_END}, False)]
+    return [({"startTime": start, "endTime": today}, closed(today, closed_after)), ({"startTime": today - 1, "endTime": OPEN_END}, False)]
+
+
+def post_days(session: requests.Session, url: str, query: Dict[str, Any], start: int, timeout: float = 5, cache: Optional[HttpCache] = None) -> Dict[str, Any]:
+    # post_query for a query over the days after start (date_gt: $startTime, date_lt: $endTime), sent as one request
+    # per day_windows part so the closed days are cached for good and only today's rows are fetched again. The row
+    # lists under each top-level key (or alias) are concatenated
+    data: Dict[str, Any] = {}
+    for variables, immutable in day_windows(start, cache.closed_after if cache is not None else 0):
+        for key, rows in post_query(session, url, with_variables(query, **variables), timeout, cache, immutable).items():
+            data[key] = data.get(key, []) + (rows or [])
+    return data
+
+
+def paginate(session: requests.Session, url: str, query: Dict[str, Any], rows: Callable[[Dict[str, Any]], List[Dict[str, Any]]], cursor_field: str = "id", cursor_variable: str = "lastId", timeout: float = 15, retries: int = 3, delay: float = 2, cache: Optional[HttpCache] = None, immutable: bool = False, **variables: Any) -> Iterator[List[Dict[str, Any]]]:
+    # Keyset pagination: every page asks for the rows after the last cursor value of the previous page, so
+    # pages cost the same however deep they are and there is no skip cap. The query must order by cursor_field
+    # and take $first and a cursor variable; cursor_field has to be unique (id rather than timestamp, ties would be lost).
+    page_size = query["variables"]["first"]
+    cursor = query["variables"][cursor_variable]
+    while True:
+        page_query = with_variables(query, **variables, **{cursor_variable: cursor})
+        page = rows(with_retries(lambda: post_query(session, url, page_query, timeout, cache, immutable), retries, delay))
+        if page:
+            yield page
+        if len(page) < page_size:
+            return
+        cursor = page[-1][cursor_field]
+
+
+def with_retries(fn: Callable[[], Any], retries: int = 3, delay: float = 2) -> Any:
+    for attempt in range(retries):
+        try:
+            return fn()
+        except Exception:
+            if attempt == retries - 1:
+                raise
+            time.sleep(delay * (attempt + 1))
+
+
+def fetch_many(items: Sequence[Any], fetch: Callable[[Any], Any], max_workers: int = 8, retries: int = 3, delay: float = 2) -> Tuple[List[Any], List[Tuple[Any, Exception]]]:
+    # Runs fetch(item) for every item on a bounded thread pool, retrying each item on its own.
+    # Returns the results in input order (None where an item failed) and the failed items.
+    results: List[Any] = [None] * len(items)
+    failed = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(with_retries, lambda item=item: fetch(item), retries, delay): i for i, item in enumerate(items)}
+        for future in as_completed(futures):
+            i = futures[future]
+            try:
+                results[i] = future.result()
+            except Exception as e:
+                failed.append((items[i], e))
+    return results, failed
+
+
+def fetch_chunked(items: Sequence[Any], fetch_chunk: Callable[[List[Any]], List[Any]], chunk_size: int, max_workers: int = 8, retries: int = 3, delay: float = 2) -> Tuple[List[Any], List[Tuple[Any, Exception]]]:
+    # Like fetch_many, but fetch_chunk takes a list of items and returns one result per item.
+    # Chunks that still fail are retried one item at a time, so one bad item does not sink its whole chunk.
+    starts = range(0, len(items), chunk_size)
+    chunks = [list(items[start:start + chunk_size]) for start in starts]
+    chunk_results, failed = fetch_many(chunks, fetch_chunk, max_workers, retries, delay)
+    results: List[Any] = [None] * len(items)
+    retry = []
+    for start, chunk, chunk_result in zip(starts, chunks, chunk_results):
+        if chunk_result is None:
+            retry.extend(range(start, start + len(chunk)))
+        else:
+            results[start:start + len(chunk)] = chunk_result
+    if retry and chunk_size > 1:
+        single_results, failed = fetch_many([[items[i]] for i in retry], fetch_chunk, max_workers, retries, delay)
+        for i, single_result in zip(retry, single_results):
+            if single_result is not None:
+                results[i] = single_result[0]
+    return results, [(chunk[0], e) for chunk, e in failed]
@@ -0,0 +1,135 @@
+import time
+import threading
+from typing import Any, Dict, List, Optional, Sequence
+import numpy as np
+import pandas as pd
+from application_logging.logger import logger
+from utils.helpers import Shared, atomic_path
+from utils.multicall import Call, Multicall, abi_contract, is_live
+
+# 10**decimals for every ERC-20 decimals value (uint8), as Python ints
+POWERS_OF_TEN = np.array([10 ** decimals for decimals in range(256)], dtype=object)
+
+TOKEN_COLUMNS = ["name", "symbol", "decimals", "price", "updated"]
+NUMERIC = {"decimals": float, "price": float, "updated": float}
+
+
+def token_amounts(raw: pd.Series, decimals: pd.Series) -> pd.Series:
+    # Raw uint256 amounts -> token units. The division runs on the Python ints themselves, so the
+    # result is exact up to the one final rounding to float. Rows without decimals (unknown tokens) are NaN.
+    known = decimals.notna().to_numpy()
+    amounts = np.full(len(raw), np.nan)
+    if known.any():
+        divisors = POWERS_OF_TEN[decimals.to_numpy()[known].astype(int)]
+        amounts[known] = (raw.to_numpy(dtype=object)[known] / divisors).astype(float)
+    return pd.Series(amounts, index=raw.index)
+
+
+class TokenRegistry:
+    # Token address (lowercase) -> price API name, on-chain symbol, decimals and last known price, kept as a
+    # Parquet snapshot between runs. Prices and decimals are refreshed in bulk from the price API; symbols,
+    # and decimals of tokens the API does not list, are resolved on chain once in a Multicall3 wave.
+    # Only prices from this run's refresh are served: a token the API no longer lists has no price (NaN).
+    def __init__(self, path: str, token_abi: str):
+        self.path = path
+        self.contract = abi_contract(token_abi)
+        self.lock = threading.RLock()
+        self.changed = False
+        self.refreshed: Optional[float] = None  # time of this run's last refresh
+        self.tokens = self.load()
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "TokenRegistry":
+        return cls(config["tokens"]["path"], config["web3"]["token_abi"])
+
+    def load(self) -> pd.DataFrame:
+        try:
+            return pd.read_parquet(self.path).set_index("address")
+        except Exception as e:
+            logger.info(f"Token registry {self.path} not readable, starting empty: {e}")
+            return pd.DataFrame(columns=TOKEN_COLUMNS, index=pd.Index([], name="address")).astype(NUMERIC)
+
+    def upsert(self, rows: pd.DataFrame) -> None:
+        # rows are indexed by lowercase address and hold a subset of TOKEN_COLUMNS
+        with self.lock:
+            tokens = self.tokens.reindex(self.tokens.index.append(rows.index.difference(self.tokens.index)))
+            tokens.loc[rows.index, rows.columns] = rows
+            self.tokens = tokens.astype(NUMERIC)
+            self.changed = True
+
+    def refresh(self, prices: Dict[str, Any]) -> None:
+        # Bulk update from a price API response
+        rows = pd.DataFrame(
+            [[i["address"].lower(), i["name"], i["decimals"], i["price"]] for i in prices["data"]],
+            columns=["address", "name", "decimals", "price"],
+        ).drop_duplicates("address").set_index("address")
+        rows["decimals"] = pd.to_numeric(rows["decimals"], errors="coerce")
+        rows["price"] = pd.to_numeric(rows["price"], errors="coerce")
+        refreshed = time.time()
+        rows["updated"] = refreshed
+        self.upsert(rows)
+        self.refreshed = refreshed
+
+    def current_prices(self, tokens: pd.DataFrame) -> pd.DataFrame:
+        # Prices not refreshed in this run are NaN; decimals and symbols stay
+        stale = tokens["price"].notna() & ~(tokens["updated"] >= (self.refreshed or float("inf")))
+        if stale.any():
+            logger.info(f"No current price for {stale.sum()} tokens, not listed by the price API this run: {', '.join(tokens.index[stale].unique())}")
+            tokens = tokens.copy()
+            tokens.loc[stale, "price"] = np.nan
+        return tokens
+
+    def lookup(self, addresses: pd.Series) -> pd.DataFrame:
+        # One row per address, aligned with the input; unknown tokens are all NaN
+        with self.lock:
+            found = self.current_prices(self.tokens.reindex(addresses.str.lower()))
+        return found.set_index(addresses.index)
+
+    def unresolved(self, addresses: Sequence[str]) -> List[str]:
+        with self.lock:
+            known = self.tokens.reindex(pd.Index([address.lower() for address in addresses]).unique())
+        missing = known[known["symbol"].isna() | known["decimals"].isna()].index
+        return [address for address in dict.fromkeys(addresses) if address.lower() in missing]
+
+    async def resolve(self, multicall: Multicall, addresses: Sequence[str]) -> None:
+        # symbol() and decimals() of the tokens not yet known, in one wave
+        addresses = self.unresolved([address for address in addresses if is_live(address)])
+        if not addresses:
+            return
+        results = await multicall.aggregate(
+            [Call(address, self.contract, fn_name) for address in addresses for fn_name in ("symbol", "decimals")]
+        )
+        symbols, decimals = results[0::2], results[1::2]
+        rows = pd.DataFrame({"symbol": symbols, "decimals": decimals}, index=pd.Index([address.lower() for address in addresses], name="address"))
+        rows["decimals"] = pd.to_numeric(rows["decimals"], errors="coerce")
+        with self.lock:
+            # Keep what is already known where the chain gave nothing
+            current = self.tokens.reindex(rows.index)
+            rows = rows.fillna(current[["symbol", "decimals"]])
+        self.upsert(rows)
+        logger.info(f"Token registry resolved {len(addresses)} tokens on chain, {rows['symbol'].isna().sum()} without a symbol")
+
+    def symbols(self, addresses: Sequence[str]) -> List[Optional[str]]:
+        with self.lock:
+            symbols = self.tokens.reindex(pd.Index([address.lower() for address in addresses]))["symbol"]
+        return [None if pd.isna(symbol) else symbol for symbol in symbols]
+
+    def price_of(self, name: str) -> float:
+        with self.lock:
+            return self.current_prices(self.tokens[self.tokens["name"] == name])["price"].iloc[0]
+
+    def save(self) -> None:
+        with self.lock:
+            if not self.changed:
+                return
+            with atomic_path(self.path) as temp:
+                self.tokens.rename_axis("address").reset_index().to_parquet(temp, index=False)
+            self.changed = False
+
+
+_registry: Shared[TokenRegistry] = Shared()
+
+
+def get_tokens(config: Dict[str, Any]) -> TokenRegistry:
+    # One instance per process, so stages running in the same pipeline share the snapshot
+    return _registry.get(lambda: TokenRegistry.from_config(config))
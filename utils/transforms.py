@@ -0,0 +1,48 @@
+from typing import Sequence
+import numpy as np
+import pandas as pd
+from utils.epochs import epochs_of
+
+TX_TYPES = pd.CategoricalDtype(["Mint", "Burn"])
+POOL_TYPES = pd.CategoricalDtype(["vAMM", "sAMM", "CL"])
+FEE_TIERS = {"vAMM": 0.20, "sAMM": 0.01}  # % of volume, V1 pools
+TVL_COLUMNS = ['timestamp', 'amountUSD', 'transaction.id', 'Tx Type', 'Pool Name', 'Pool Address', 'Pool Type', 'date', 'TVL_inflow', 'TVL_outflow', 'TVL_change']
+
+
+def tvl_flows(tvl_df: pd.DataFrame) -> pd.DataFrame:
+    # Mint/burn events -> dated rows with TVL inflow, outflow and net change, sorted by timestamp
+    tvl_df = tvl_df.copy()
+    tvl_df['timestamp'] = pd.to_numeric(tvl_df['timestamp'])
+    tvl_df['amountUSD'] = pd.to_numeric(tvl_df['amountUSD'])
+    tvl_df['Tx Type'] = tvl_df['Tx Type'].astype(TX_TYPES)
+    tvl_df['date'] = pd.to_datetime(tvl_df['timestamp'], unit='s').dt.strftime('%Y-%m-%d')
+    tvl_df.sort_values('timestamp', ascending=True, inplace=True)
+
+    amount = tvl_df['amountUSD'].to_numpy(dtype=float)
+    mint = (tvl_df['Tx Type'] == 'Mint').to_numpy()
+    burn = (tvl_df['Tx Type'] == 'Burn').to_numpy()
+    tvl_df['TVL_inflow'] = np.where(mint, amount, 0.0)
+    tvl_df['TVL_outflow'] = np.where(burn, amount, 0.0)
+    tvl_df['TVL_change'] = np.where(mint, amount, -amount)
+    return tvl_df[TVL_COLUMNS]
+
+
+def pair_days(pair_df: pd.DataFrame, ids_df: pd.DataFrame, id_columns: Sequence[str]) -> pd.DataFrame:
+    # Subgraph pair-day rows (date as a unix timestamp) -> rows with the pool's ID columns, epoch and
+    # categorical type, sorted by day with the date as YYYY-MM-DD
+    pair_df = pair_df.merge(ids_df[list(id_columns)], how="left", on="name")
+    timestamp = pd.to_numeric(pair_df['date'])
+    days = pd.to_datetime(timestamp, unit='s').to_numpy().astype('datetime64[D]')
+    pair_df['epoch'] = epochs_of(timestamp.to_numpy())
+    pair_df['type'] = pair_df['type'].astype(POOL_TYPES)
+    pair_df['date'] = np.datetime_as_string(days, unit='D')
+    return pair_df.iloc[np.argsort(days, kind='stable')]
+
+
+def pair_fees(pair_df: pd.DataFrame) -> pd.DataFrame:
+    # Fee tier and daily fees of V1 pools
+    pair_df = pair_df.copy()
+    pair_df['fee %'] = pair_df['type'].map(FEE_TIERS).astype(float)
+    pair_df['dailyVolumeUSD'] = pd.to_numeric(pair_df['dailyVolumeUSD'])
+    pair_df['fee'] = (pair_df['dailyVolumeUSD'] * pair_df['fee %']) / 100
+    return pair_df